@@ -0,0 +1,344 @@
+"""
+End-to-end benchmark of the reply path, fully offline.
+
+Starts a mock OpenAI-compatible chat-completions server with configurable latency
+and token rate, points the LLM gateway at it, and drives the bot's on_message (or
+generate_content directly) with synthetic mention events from N concurrent users.
+
+Run from the repository root:
+    python src/benchmark.py --users 20 --messages 10 --latency 0.3 --tokens-per-second 60
+    python src/benchmark.py --replay src/db/cassettes/llm_cassette.jsonl.gz --realtime --task-fallback
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+from aiohttp import web
+from config import Config
+
+MOCK_REPLY = "ooh hewwo fwiend!! i was just watching the wain on the pond... what u up to? :o"
+SAMPLE_MESSAGES = [
+    "gm fwog",
+    "wen token?",
+    "hi",
+    "what are you doing today?",
+    "do you like flies",
+    "tell me about $FWOGAI",
+    "how is the pond",
+    "what's your story right now?"
+]
+
+class MockChatServer:
+    """Minimal OpenAI-compatible /v1/chat/completions endpoint"""
+
+    def __init__(self, latency=0.3, tokens_per_second=50.0, reply=MOCK_REPLY):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.reply = reply
+        self.requests = 0
+        self._runner = None
+
+    def _payload(self, body, content=None, delta=None, finish_reason=None):
+        choice = {'index': 0, 'finish_reason': finish_reason}
+        if delta is not None:
+            choice['delta'] = delta
+            kind = 'chat.completion.chunk'
+        else:
+            choice['message'] = {'role': 'assistant', 'content': content}
+            kind = 'chat.completion'
+        payload = {
+            'id': f'mock-{self.requests}',
+            'object': kind,
+            'created': int(time.time()),
+            'model': body.get('model', 'mock'),
+            'choices': [choice]
+        }
+        if delta is None:
+            prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in body.get('messages', []))
+            completion_tokens = len(content.split())
+            payload['usage'] = {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        return payload
+
+    def _content_for(self, body):
+        system = str(body.get('messages', [{}])[0].get('content', ''))
+        if 'selected_memories' in json.dumps(body.get('messages', [])):
+            return json.dumps({'selected_memories': []})
+        if 'JSON' in system and 'topics' in system:
+            return json.dumps({'topics': []})
+        return self.reply
+
+    async def handle(self, request):
+        self.requests += 1
+        body = await request.json()
+        content = self._content_for(body)
+        tokens = content.split(' ')
+        await asyncio.sleep(self.latency)
+
+        if not body.get('stream'):
+            await asyncio.sleep(len(tokens) / self.tokens_per_second)
+            return web.json_response(self._payload(body, content=content))
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        for index, token in enumerate(tokens):
+            piece = token if index == 0 else ' ' + token
+            chunk = self._payload(body, delta={'content': piece})
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(1 / self.tokens_per_second)
+        done = self._payload(body, delta={}, finish_reason='stop')
+        await response.write(f"data: {json.dumps(done)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def start(self, host='127.0.0.1', port=0):
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}/v1"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+class FakeUser:
+    def __init__(self, user_id, name, bot=False):
+        self.id = user_id
+        self.name = name
+        self.bot = bot
+
+    def __eq__(self, other):
+        return isinstance(other, FakeUser) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+class FakeReply:
+    def __init__(self, message, content):
+        self.message = message
+        self.content = content
+        self.edits = 0
+
+    async def edit(self, content):
+        self.content = content
+        self.edits += 1
+        self.message.shown = content
+
+class FakeMessage:
+    """Just enough of discord.Message for on_message and the reply path"""
+
+    def __init__(self, bot_user, author, text, on_reply):
+        self.content = f"<@{bot_user.id}> {text}"
+        self.author = author
+        self.mentions = [bot_user]
+        self.created = time.perf_counter()
+        self.first_posted = None
+        # What the user sees last: the latest reply or edit
+        self.shown = None
+        self._on_reply = on_reply
+
+    async def reply(self, content):
+        if self.first_posted is None:
+            self.first_posted = time.perf_counter()
+        self.shown = content
+        self._on_reply(self, content)
+        return FakeReply(self, content)
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a sleeping task"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(loop.time() - expected, 0.0))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+def percentile(values, quantile):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(int(round(quantile * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+def format_latencies(label, values):
+    return (
+        f"{label} p50 {percentile(values, 0.5) * 1000:.1f}ms  "
+        f"p95 {percentile(values, 0.95) * 1000:.1f}ms  "
+        f"p99 {percentile(values, 0.99) * 1000:.1f}ms  "
+        f"mean {statistics.mean(values) * 1000:.1f}ms"
+    )
+
+def format_report(title, latencies, elapsed, errors, shed, lags, first_post=()):
+    """latencies are full-reply times; first_post, when given, the time until the first visible reply"""
+    lines = [
+        f"== {title} ==",
+        f"replies: {len(latencies)}  errors: {errors}  shed: {shed}  elapsed: {elapsed:.2f}s",
+        f"throughput: {len(latencies) / elapsed:.2f} replies/s" if elapsed else "throughput: n/a"
+    ]
+    if first_post:
+        lines.append(format_latencies("first post", first_post))
+    if latencies:
+        lines.append(format_latencies("full reply" if first_post else "latency", latencies))
+    if lags:
+        lines.append(
+            f"loop lag p50 {percentile(lags, 0.5) * 1000:.2f}ms  "
+            f"p99 {percentile(lags, 0.99) * 1000:.2f}ms  "
+            f"max {max(lags) * 1000:.2f}ms"
+        )
+    return "\n".join(lines)
+
+async def run_benchmark(args):
+    server = MockChatServer(latency=args.latency, tokens_per_second=args.tokens_per_second)
+    base_url = await server.start()
+
+    # Point everything at the mock before the bot module builds its clients
+    Config.LLM_API_BASE = base_url
+    Config.OPENAI_API_KEY = Config.OPENAI_API_KEY or 'benchmark'
+    Config.STREAM_REPLIES = args.stream
+    Config.MENTION_WORKERS = args.workers
+    Config.MENTION_QUEUE_DEPTH = args.queue_depth
+    Config.MEMORY_SELECTION_MODE = args.memory_mode
+    if args.replay:
+        # Serve recorded production completions instead of the mock's canned reply
+        Config.LLM_CASSETTE_MODE = 'replay'
+        Config.LLM_CASSETTE_PATH = args.replay
+        Config.LLM_CASSETTE_REALTIME = args.realtime
+        Config.LLM_CASSETTE_TASK_FALLBACK = args.task_fallback
+
+    import bot as bot_module
+    import llm_gateway
+
+    # Keep synthetic traffic out of the real conversation journal
+    bot_module.journal.directory = tempfile.mkdtemp(prefix='fwog-bench-journal-')
+    bot_module.load_current_context()
+
+    bot_user = FakeUser(1, 'fwog-ai', bot=True)
+    bot_module.bot._connection.user = bot_user
+
+    latencies = []
+    first_post = []
+    errors = 0
+    shed = 0
+    pending = {}
+
+    def on_reply(message, content):
+        nonlocal shed
+        # Shed mentions are answered by on_message and never reach the handler
+        if content in bot_module.BUSY_REPLIES:
+            future = pending.pop(message, None)
+            if future is not None and not future.done():
+                shed += 1
+                future.set_result(None)
+
+    def on_handled(message):
+        nonlocal errors
+        future = pending.pop(message, None)
+        if future is None or future.done():
+            return
+        if message.shown is None or bot_module.fallback_pool.contains(message.shown):
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - message.created)
+            first_post.append(message.first_posted - message.created)
+        future.set_result(None)
+
+    handler = bot_module.mention_queue.handler
+
+    async def handle_and_record(message, queue_wait):
+        # Resolve only once the handler returns, so streamed replies are complete
+        try:
+            await handler(message, queue_wait)
+        finally:
+            on_handled(message)
+
+    bot_module.mention_queue.handler = handle_and_record
+
+    async def user_session(index):
+        nonlocal errors
+        # Synthetic authors are flagged as bots so discord.py skips command parsing
+        author = FakeUser(1000 + index, f'user{index}', bot=True)
+        for turn in range(args.messages):
+            text = SAMPLE_MESSAGES[(index + turn) % len(SAMPLE_MESSAGES)]
+            if args.direct:
+                started = time.perf_counter()
+                try:
+                    await bot_module.generate_content(text, author.id, author.name)
+                    latencies.append(time.perf_counter() - started)
+                except Exception:
+                    errors += 1
+                continue
+            message = FakeMessage(bot_user, author, text, on_reply)
+            future = asyncio.get_running_loop().create_future()
+            pending[message] = future
+            await bot_module.on_message(message)
+            await future
+
+    if not args.direct:
+        bot_module.mention_queue.start()
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(user_session(index) for index in range(args.users)))
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+
+    title = (
+        f"{'generate_content' if args.direct else 'on_message'} | {args.users} users x {args.messages} messages | "
+        f"latency {args.latency}s, {args.tokens_per_second} tok/s | stream={args.stream}"
+    )
+    print(format_report(title, latencies, elapsed, errors, shed, monitor.lags, first_post))
+    print(f"mock server requests: {server.requests}")
+    if args.replay:
+        from cassette import get_cassette
+        print(f"cassette: {get_cassette().stats()}")
+
+    if not args.direct:
+        await bot_module.mention_queue.stop()
+    await llm_gateway.close()
+    await server.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the reply path")
+    parser.add_argument('--users', type=int, default=10, help="concurrent synthetic users")
+    parser.add_argument('--messages', type=int, default=5, help="mentions sent by each user, one after another")
+    parser.add_argument('--latency', type=float, default=0.3, help="mock server time to first token (s)")
+    parser.add_argument('--tokens-per-second', type=float, default=50.0, help="mock server generation rate")
+    parser.add_argument('--stream', action='store_true', help="use streaming replies")
+    parser.add_argument('--direct', action='store_true', help="call generate_content instead of on_message")
+    parser.add_argument('--workers', type=int, default=Config.MENTION_WORKERS)
+    parser.add_argument('--queue-depth', type=int, default=Config.MENTION_QUEUE_DEPTH)
+    parser.add_argument('--memory-mode', default='local', choices=['local', 'llm'])
+    parser.add_argument('--replay', metavar='CASSETTE', help="replay a recorded LLM cassette instead of the mock")
+    parser.add_argument('--realtime', action='store_true', help="with --replay, reproduce the recorded latencies")
+    parser.add_argument('--task-fallback', action='store_true',
+                        help="with --replay, serve unmatched requests a recording of the same task")
+    args = parser.parse_args(argv)
+    asyncio.run(run_benchmark(args))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
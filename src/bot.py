@@ -2,164 +2,506 @@
 
 import discord
 import asyncio
+import inspect
 import json
 import logging
+import os
 import random
+import re
+import signal
+import socket
 from discord.ext import commands
-import openai
 from config import Config
-from prompts import SYSTEM_PROMPTS, TOPICS
+from llm_gateway import chat_completion, circuit_open
+from model_router import get_router
+from fallback_replies import FallbackReplyPool
+from prompts import SYSTEM_PROMPTS, TOPICS, BUSY_REPLIES
 from discord.ext import tasks
 from datetime import datetime, time
 from memory_processor import process_daily_memories
 from memory_decision import select_relevant_memories
-from story_circle_manager import get_current_context, update_story_circle, progress_narrative
+from mention_queue import MentionQueue
+from conversation_journal import ConversationJournal
+from persistence import writer
+from state_backend import ConversationHistory, LeaderLease, create_backend
+from prompt_budget import PromptSection, assemble_sections, count_tokens, truncate_to_tokens
+from structured_logging import configure_logging, log_event
+from metrics import MENTIONS, PROMPT_PREFIX, PROMPT_PREFIX_TOKENS, QUEUE_DEPTH, QUEUE_WAIT_SECONDS, STAGE_ERRORS, STAGE_SECONDS, start_metrics_server, time_stage
+from story_circle_manager import adopt_context, get_current_context, load_current_context, resume_lookahead, update_story_circle, progress_narrative
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (queued, formatted off the event loop)
+configure_logging()
 logger = logging.getLogger('discord_bot')
 
-# Initialize OpenAI
-openai.api_key = Config.OPENAI_API_KEY
-openai.api_base = "https://glhf.chat/api/openai/v1"
-
 # Initialize the bot with intents
 intents = discord.Intents.default()
 intents.message_content = True  # Enable message content intent
 intents.guilds = True  # Enable basic guild intent
 intents.guild_messages = True  # Enable guild messages
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+class FwogBot(commands.AutoShardedBot if Config.SHARD_COUNT > 1 else commands.Bot):
+    _close_task = None
+
+    async def setup_hook(self):
+        # run() only handles KeyboardInterrupt; the shard launcher stops workers with SIGTERM
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self._close_on_signal)
+        except NotImplementedError:
+            pass  # No loop signal handlers on Windows
+
+    def _close_on_signal(self):
+        if self._close_task is None:
+            logger.info("Received SIGTERM, shutting down")
+            self._close_task = asyncio.create_task(self.close())
+
+    async def close(self):
+        """Write out buffered state before disconnecting"""
+        if not self.is_closed():
+            await shutdown()
+        await super().close()
+
+if Config.SHARD_COUNT > 1:
+    # Sharded deployment: this process runs SHARD_IDS (or every shard) of SHARD_COUNT
+    bot = FwogBot(
+        command_prefix='!',
+        intents=intents,
+        shard_count=Config.SHARD_COUNT,
+        shard_ids=Config.SHARD_IDS or None
+    )
+else:
+    bot = FwogBot(command_prefix='!', intents=intents)
 
 # Load length formats
 with open('src/length_formats.json', 'r') as f:
     length_formats = json.load(f)['formats']
 
-# In-memory conversation history
-user_conversations = {}
+# In-character replies served instantly while the model is unreachable
+fallback_pool = FallbackReplyPool(
+    [length_format['format'] for length_format in length_formats],
+    path=Config.FALLBACK_REPLIES_PATH,
+    per_format=Config.FALLBACK_REPLIES_PER_FORMAT
+)
+
+# State shared with the other bot processes (in-process unless STATE_BACKEND says otherwise)
+state = create_backend()
+
+# Conversation history (live context window only), shared across shards
 MAX_MEMORY = 2
+conversations = ConversationHistory(state, MAX_MEMORY)
 
-def add_to_conversation_history(user_id, message, is_bot):
-    if user_id not in user_conversations:
-        user_conversations[user_id] = []
-    
-    user_conversations[user_id].append({
-        'content': message,
-        'is_bot': is_bot,
-        'timestamp': asyncio.get_event_loop().time()
-    })
-    
-    # Keep only the last MAX_MEMORY messages
-    if len(user_conversations[user_id]) > MAX_MEMORY:
-        user_conversations[user_id].pop(0)
+# Only the holder of this lease runs the narrative and nightly jobs
+leader = LeaderLease(state, 'jobs', f"{socket.gethostname()}:{os.getpid()}", Config.LEADER_LEASE_TTL)
+
+# Append-only record of the day's conversations for nightly processing, one file set per process
+journal = ConversationJournal(
+    flush_interval=Config.JOURNAL_FLUSH_INTERVAL,
+    name='shard' + '-'.join(map(str, Config.SHARD_IDS)) if Config.SHARD_IDS else ''
+)
 
-def get_conversation_context(user_id):
-    history = user_conversations.get(user_id, [])
+async def add_to_conversation_history(user_id, message, is_bot):
+    await conversations.append(user_id, message, is_bot)
+    journal.append(user_id, message, is_bot)
+
+async def get_conversation_context(user_id):
+    history = await conversations.get(user_id)
     return '\n'.join([
         f"{'Assistant' if msg['is_bot'] else 'User'}: {msg['content']}"
         for msg in history
     ])
 
 def get_random_format():
-    random_format = random.choice(length_formats)['format']
-    logger.info(f"Selected random format: {random_format}")
-    return random_format
+    return random.choice(length_formats)['format']
+
+async def run_stage(name, stage, timeout, default):
+    """Run one pre-generation stage, falling back to default if it fails or misses its deadline"""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    try:
+        result = stage()
+        if inspect.isawaitable(result):
+            result = await asyncio.wait_for(result, timeout)
+        return result
+    except asyncio.TimeoutError:
+        STAGE_ERRORS.inc(stage=name)
+        logger.warning("Stage %s missed its %ss deadline, continuing without it", name, timeout)
+        return default
+    except Exception as e:
+        STAGE_ERRORS.inc(stage=name)
+        logger.error("Error in stage %s: %s", name, e)
+        return default
+    finally:
+        STAGE_SECONDS.observe(loop.time() - started, stage=name)
+
+def memory_stage_timeout():
+    """Deadline for memory selection: a local lookup is fast, an LLM pick waits on a completion"""
+    if Config.MEMORY_SELECTION_MODE == 'llm':
+        return Config.MEMORY_LLM_STAGE_TIMEOUT
+    return Config.MEMORY_STAGE_TIMEOUT
+
+def check_memory_stage_timeout():
+    """Warn when LLM memory selection would be cancelled before its route gives up"""
+    if Config.MEMORY_SELECTION_MODE != 'llm':
+        return
+    route_timeout = get_router().resolve('memory_select')[1]['timeout'] or Config.LLM_TIMEOUT
+    if Config.MEMORY_LLM_STAGE_TIMEOUT < route_timeout:
+        logger.warning(
+            f"MEMORY_LLM_STAGE_TIMEOUT ({Config.MEMORY_LLM_STAGE_TIMEOUT}s) is below the memory_select "
+            f"route timeout ({route_timeout}s); slow selections will be discarded"
+        )
+
+async def gather_generation_inputs(user_message, user_id, user_identifier):
+    """Run the independent pre-generation stages concurrently"""
+    return await asyncio.gather(
+        run_stage('format', get_random_format, None, length_formats[0]['format']),
+        run_stage('context', lambda: get_conversation_context(user_id), None, ''),
+        run_stage(
+            'memories',
+            lambda: select_relevant_memories(user_identifier, user_message),
+            memory_stage_timeout(),
+            ''
+        ),
+        run_stage(
+            'narrative',
+            get_current_context,
+            Config.NARRATIVE_STAGE_TIMEOUT,
+            {'current_event': '', 'current_inner_dialogue': ''}
+        )
+    )
+
+REPLY_STYLE_RULES = (
+    "Respond like a text message using text-speak and replacing 'r' with 'fw' and 'l' with 'w'. "
+    "And do not use emojis. Keep the conversation context and your memories in mind when responding."
+)
+
+# Last static prefix built for the prefix layout, reused while the narrative is unchanged
+_reply_prefix = {'key': None, 'text': None}
+
+def build_reply_prefix(narrative_context):
+    """
+    System prompt, style rules and narrative, in that order.
+    Everything here changes only when the narrative moves, so the text is
+    byte-identical across replies and a provider prefix cache can reuse it.
+    """
+    key = (narrative_context['current_event'], narrative_context['current_inner_dialogue'])
+    if key == _reply_prefix['key']:
+        PROMPT_PREFIX.inc(result='reused')
+        return _reply_prefix['text']
+    # Truncation is deterministic, so the same narrative always gives the same prefix
+    budget = Config.REPLY_PROMPT_BUDGET // 4
+    text = f"""{SYSTEM_PROMPTS["style1"]}
+.
+{REPLY_STYLE_RULES}
+
+Your character has an arc, if it seems relevant to your response, mention it.
+Current event: {truncate_to_tokens(key[0], budget)}
+Inner dialogue to this event: {truncate_to_tokens(key[1], budget)}"""
+    _reply_prefix.update(key=key, text=text)
+    PROMPT_PREFIX.inc(result='changed')
+    PROMPT_PREFIX_TOKENS.set(count_tokens(text))
+    return text
+
+def build_prefix_layout_messages(user_identifier, user_message, random_format, conversation_context, memories, narrative_context):
+    """Static prefix in the system turn; per-user and per-message data last in the user turn"""
+    packed = assemble_sections([
+        PromptSection('message', user_message, 0),
+        PromptSection('context', conversation_context, 1, keep='end'),
+        PromptSection('memories', memories, 2)
+    ], Config.REPLY_PROMPT_BUDGET)
+    return [
+        {
+            "role": "system",
+            "content": build_reply_prefix(narrative_context)
+        },
+        {
+            "role": "user",
+            "content": f"""Previous conversation:
+{packed['context']}
+
+Your memories: {packed['memories']}
+
+Let this emotion shape your response: {random_format}.
+
+New message from {user_identifier}: "{packed['message']}\""""
+        }
+    ]
+
+async def build_reply_messages(user_message, user_id, username):
+    """Gather the generation inputs and build the chat messages for a reply"""
+    # First, gather all required data
+    user_identifier = f"@{username}" if username else f"User#{user_id}"
+    random_format, conversation_context, memories, narrative_context = await gather_generation_inputs(
+        user_message, user_id, user_identifier
+    )
+    
+    # One sampled record with everything the reply was built from
+    log_event(
+        logger,
+        'reply_inputs',
+        user=user_identifier,
+        user_message=user_message,
+        conversation_context=conversation_context,
+        random_format=random_format,
+        memories=memories,
+        current_event=narrative_context['current_event'],
+        inner_dialogue=narrative_context['current_inner_dialogue']
+    )
+    
+    if Config.PROMPT_LAYOUT == 'prefix':
+        return build_prefix_layout_messages(
+            user_identifier, user_message, random_format, conversation_context, memories, narrative_context
+        )
+    
+    # Pack the variable parts into the token budget, most valuable first
+    packed = assemble_sections([
+        PromptSection('message', user_message, 0),
+        PromptSection('context', conversation_context, 1, keep='end'),
+        PromptSection('memories', memories, 2),
+        PromptSection('event', narrative_context['current_event'], 3),
+        PromptSection('inner_dialogue', narrative_context['current_inner_dialogue'], 4)
+    ], Config.REPLY_PROMPT_BUDGET)
+    
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPTS["style1"] + "\n."
+        },
+        {
+            "role": "user",
+            "content": f"""Previous conversation:
+{packed['context']}
+
+New message from {user_identifier}: "{packed['message']}"
+
+Let this emotion shape your response: {random_format}. Remember to respond like a text message using text-speak and replacing 'r' with 'fw' and 'l' with 'w'. And do not use emojis. Keep the conversation context in mind when responding; keep your memories in mind when responding: {packed['memories']}. Your character has an arc, if it seems relevant to your response, mention it, where the current event is: {packed['event']} and the inner dialogue to such an event is: {packed['inner_dialogue']}."""
+        }
+    ]
 
 async def generate_content(user_message, user_id, username):
     try:
-        # First, gather all required data
-        random_format = get_random_format()
-        conversation_context = get_conversation_context(user_id)
-        user_identifier = f"@{username}" if username else f"User#{user_id}"
-        
-        # Get relevant memories for this conversation - add await here
-        memories = await select_relevant_memories(user_identifier, user_message)
-        
-        # Get current story circle context
-        narrative_context = get_current_context()
+        messages = await build_reply_messages(user_message, user_id, username)
         
-        # Now that we have all data, log it
-        logger.info("=== Message Generation Details ===")
-        logger.info(f"Conversation Context: {conversation_context}")
-        logger.info(f"User Identifier: {user_identifier}")
-        logger.info(f"User Message: {user_message}")
-        logger.info(f"Random Format: {random_format}")
-        logger.info(f"Memories: {memories}")
-        logger.info(f"Current Event: {narrative_context['current_event']}")
-        logger.info(f"Inner Dialogue: {narrative_context['current_inner_dialogue']}")
-        logger.info("===============================")
-        
-        messages = [
-            {
-                "role": "system",
-                "content": SYSTEM_PROMPTS["style1"] + "\n."
-            },
-            {
-                "role": "user",
-                "content": f"""Previous conversation:
-{conversation_context}
-
-New message from {user_identifier}: "{user_message}"
-
-Let this emotion shape your response: {random_format}. Remember to respond like a text message using text-speak and replacing 'r' with 'fw' and 'l' with 'w'. And do not use emojis. Keep the conversation context in mind when responding; keep your memories in mind when responding: {memories}. Your character has an arc, if it seems relevant to your response, mention it, where the current event is: {narrative_context['current_event']} and the inner dialogue to such an event is: {narrative_context['current_inner_dialogue']}."""
-            }
-        ]
-        
-        response = await openai.ChatCompletion.acreate(
-            model=Config.AI_MODEL,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=70
+        response = await chat_completion(
+            messages,
+            task='reply',
+            temperature=0.7
         )
         
-        content = response.choices[0].message['content']
+        content = response.choices[0].message.content
         
         # Remove any @ mentions from the start of the response
         if content.startswith('@'):
             content = content.split(' ', 1)[1] if ' ' in content else ''
         
         # Add to conversation history
-        add_to_conversation_history(user_id, user_message, False)
-        add_to_conversation_history(user_id, content, True)
+        await add_to_conversation_history(user_id, user_message, False)
+        await add_to_conversation_history(user_id, content, True)
         
         return content
     except Exception as e:
-        logger.error(f"Error generating content: {e}")
+        logger.error("Error generating content: %s", e)
+        raise e
+
+class LeadingMentionStripper:
+    """Incrementally drops an @mention at the start of a streamed response"""
+    
+    def __init__(self):
+        self.pending = ''
+        self.decided = False
+    
+    def feed(self, text):
+        """Return the part of text that is safe to show"""
+        if self.decided:
+            return text
+        self.pending += text
+        if not self.pending:
+            return ''
+        if not self.pending.startswith('@'):
+            self.decided = True
+            text, self.pending = self.pending, ''
+            return text
+        if ' ' in self.pending:
+            self.decided = True
+            text, self.pending = self.pending.split(' ', 1)[1], ''
+            return text
+        # Still inside the mention, hold it back
+        return ''
+    
+    def finish(self):
+        """Flush at end of stream; a response that is only a mention becomes empty"""
+        self.decided = True
+        self.pending = ''
+        return ''
+
+async def stream_content(user_message, user_id, username):
+    """Yield the reply text in pieces as the model produces them"""
+    try:
+        messages = await build_reply_messages(user_message, user_id, username)
+        
+        response = await chat_completion(
+            messages,
+            task='reply',
+            temperature=0.7,
+            stream=True
+        )
+        
+        stripper = LeadingMentionStripper()
+        content = ''
+        async for chunk in response:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            text = stripper.feed(delta)
+            if text:
+                content += text
+                yield text
+        stripper.finish()
+        
+        # Add to conversation history once the whole reply is known
+        await add_to_conversation_history(user_id, user_message, False)
+        await add_to_conversation_history(user_id, content, True)
+    except Exception as e:
+        logger.error("Error streaming content: %s", e)
         raise e
 
+SENTENCE_END = re.compile(r'[.!?\n]')
+
+class PartialReplyError(Exception):
+    """A streamed reply failed after part of it was already posted"""
+
+async def reply_streaming(message, user_message, user_id, username):
+    """
+    Reply as soon as the first sentence is ready, then edit the message as more text arrives.
+    Edits are batched to at most one per STREAM_EDIT_INTERVAL seconds to stay under Discord's rate limits.
+    If the stream fails once a reply is posted, that reply is finished with the text received so far
+    and PartialReplyError is raised, so the caller does not post a second message.
+    """
+    loop = asyncio.get_running_loop()
+    reply = None
+    content = ''
+    shown = ''
+    last_edit = 0.0
+    
+    try:
+        async for text in stream_content(user_message, user_id, username):
+            content += text
+            if reply is None:
+                if SENTENCE_END.search(content) and content.strip():
+                    reply = await message.reply(content)
+                    shown = content
+                    last_edit = loop.time()
+            elif loop.time() - last_edit >= Config.STREAM_EDIT_INTERVAL:
+                await reply.edit(content=content)
+                shown = content
+                last_edit = loop.time()
+    except Exception as e:
+        if reply is None:
+            raise
+        if content != shown:
+            try:
+                await reply.edit(content=content)
+            except Exception as edit_error:
+                logger.error("Error finishing partial reply: %s", edit_error)
+        raise PartialReplyError(str(e)) from e
+    
+    if not content.strip():
+        raise ValueError("Empty streamed response")
+    if reply is None:
+        await message.reply(content)
+    elif content != shown:
+        await reply.edit(content=content)
+
+def fallback_reply():
+    """An in-character reply for a random format and the current event, without the model"""
+    return fallback_pool.pick(get_random_format(), get_current_context()['current_event'])
+
+async def handle_mention(message, queue_wait):
+    """Generate and send the reply for one queued mention"""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    QUEUE_WAIT_SECONDS.observe(queue_wait)
+    if circuit_open('reply'):
+        # The model is failing: answer instantly in character instead of walking the pipeline
+        MENTIONS.inc(outcome='fallback')
+        await message.reply(fallback_reply())
+        return
+    try:
+        user_id = message.author.id
+        username = message.author.name
+        # Remove the mention using Discord's proper mention format
+        user_message = message.content.replace(f'<@{bot.user.id}>', '').strip()
+        
+        if Config.STREAM_REPLIES:
+            async with time_stage('stream_reply'):
+                await reply_streaming(message, user_message, user_id, username)
+        else:
+            async with time_stage('generation'):
+                response = await generate_content(user_message, user_id, username)
+            async with time_stage('discord_reply'):
+                await message.reply(response)
+        MENTIONS.inc(outcome='replied')
+        log_event(
+            logger,
+            'reply_sent',
+            queue_wait=round(queue_wait, 3),
+            generation_seconds=round(loop.time() - started, 3)
+        )
+    except PartialReplyError as e:
+        # The user already has the start of the reply; a fallback would be a second, unrelated message
+        MENTIONS.inc(outcome='failed')
+        logger.error('Streamed reply cut short: %s', e)
+    except Exception as e:
+        MENTIONS.inc(outcome='failed')
+        logger.error('Error handling mention: %s', e)
+        await message.reply(fallback_reply())
+
+mention_queue = MentionQueue(
+    handle_mention,
+    workers=Config.MENTION_WORKERS,
+    max_depth=Config.MENTION_QUEUE_DEPTH
+)
+QUEUE_DEPTH.set_function(lambda: mention_queue.depth)
+metrics_runner = None
+
 @bot.event
 async def on_ready():
     logger.info(f'Logged in as {bot.user.name} - {bot.user.id}')
     logger.info(f'Bot mention string: <@{bot.user.id}>')
+    load_current_context()  # Read the narrative snapshot once; later updates are published in memory
+    check_memory_stage_timeout()
+    mention_queue.start()  # Start the mention workers
+    journal.start()  # Start flushing the conversation journal
+    global metrics_runner
+    if Config.METRICS_PORT and metrics_runner is None:
+        try:
+            metrics_runner = await start_metrics_server(Config.METRICS_HOST, Config.METRICS_PORT)
+        except OSError as e:
+            # A broken metrics endpoint must not keep the jobs below from starting
+            logger.error(f"Could not serve metrics on port {Config.METRICS_PORT}: {e}")
+    fallback_pool.load()  # Replies persisted by an earlier run, in case the model is already down
+    if not sync_shared_state.is_running():
+        await sync_shared_state()  # Settle leadership before the jobs' first run
+        sync_shared_state.start()  # Keep renewing the lease / following the leader
+    if not refresh_fallback_replies.is_running():
+        refresh_fallback_replies.start()  # Keep the outage reply pool current
     process_memories.start()  # Start the memory processing task
     update_narrative.start()  # Start the narrative update task
-    print('Discord AI Bot is online!')
+    logger.info('Discord AI Bot is online!')
 
 @bot.event
 async def on_message(message):
     # Add debug logging
-    logger.debug(f'Received message: {message.content}')
+    logger.debug('Received message: %s', message.content)
     
     if message.author == bot.user:
         return  # Prevent bot from responding to its own messages
     
     # Update mention detection to use Discord's built-in mention system
     if bot.user in message.mentions:
-        try:
-            logger.info(f'Bot was mentioned in message: {message.content}')
-            
-            user_id = message.author.id
-            username = message.author.name
-            # Remove the mention using Discord's proper mention format
-            user_message = message.content.replace(f'<@{bot.user.id}>', '').strip()
-            
-            response = await generate_content(user_message, user_id, username)
-            
-            await message.reply(response)
-            logger.info('Bot replied to mention successfully')
-        except Exception as e:
-            logger.error(f'Error handling mention: {e}')
-            await message.reply("Sorry, I couldn't process your request at the moment.")
+        log_event(logger, 'mention_received', content=message.content)
+        if not mention_queue.submit(message):
+            # Too many mentions in flight, answer cheaply instead of queueing
+            MENTIONS.inc(outcome='shed')
+            await message.reply(random.choice(BUSY_REPLIES))
     
     await bot.process_commands(message)
 
@@ -175,27 +517,91 @@ async def on_error(event, *args, **kwargs):
     if event == 'on_message':
         await args[0].reply("An unexpected error occurred while processing your message.")
 
+async def publish_shared_context():
+    """Share the leader's narrative context with the other processes"""
+    try:
+        await state.call('set', 'narrative', 'context', dict(get_current_context()))
+    except Exception as e:
+        logger.error(f"Error publishing shared narrative context: {e}")
+
+@tasks.loop(seconds=Config.LEADER_LEASE_TTL / 3)
+async def sync_shared_state():
+    """Renew the job lease; followers adopt the narrative context the leader published"""
+    was_leader = leader.is_leader
+    if await leader.renew():
+        if not was_leader:
+            # New leader: serve the story circle on disk and share it
+            load_current_context()
+            await publish_shared_context()
+            await resume_lookahead()  # Don't leave a phase change to a live generation
+        return
+    try:
+        context = await state.call('get', 'narrative', 'context')
+        if context:
+            adopt_context(context)
+    except Exception as e:
+        logger.error(f"Error reading shared narrative context: {e}")
+
+@tasks.loop(seconds=Config.FALLBACK_REFRESH_INTERVAL)
+async def refresh_fallback_replies():
+    """Leader regenerates the fallback pool for the current event; others reload it"""
+    try:
+        if not leader.is_leader:
+            await asyncio.to_thread(fallback_pool.load)
+        elif not circuit_open('fallback_pool'):
+            await fallback_pool.refresh(get_current_context()['current_event'])
+    except Exception as e:
+        logger.error(f"Error refreshing fallback replies: {e}")
+
 @tasks.loop(time=time(hour=23, minute=55))  # Run at 23:55 every day
 async def process_memories():
+    if not leader.is_leader:
+        return
     try:
         logger.info("Starting nightly memory processing...")
-        await process_daily_memories(user_conversations)
-        # Clear the day's conversations after processing
-        user_conversations.clear()
-        logger.info("Nightly memory processing completed")
+        paths = await journal.claim_pending()
+        conversations = await asyncio.to_thread(journal.load_conversations, paths)
+        async with time_stage('nightly_analysis'):
+            await process_daily_memories(conversations)
+        # Mark the day's journal as processed so it is not analyzed again
+        journal.mark_processed(paths)
+        removed = await asyncio.to_thread(journal.purge_processed, Config.JOURNAL_RETENTION_DAYS)
+        logger.info(f"Nightly memory processing completed ({removed} old journal files removed)")
     except Exception as e:
         logger.error(f"Error in nightly memory processing: {e}")
 
 @tasks.loop(hours=6)
 async def update_narrative():
+    if not leader.is_leader:
+        return
     try:
         logger.info("Progressing story circle narrative...")
-        await progress_narrative()  # This will either move to next event or generate new content
+        async with time_stage('narrative_generation'):
+            await progress_narrative()  # This will either move to next event or generate new content
+        await publish_shared_context()
         logger.info("Story circle progression completed")
     except Exception as e:
         logger.error(f"Error in story circle progression: {e}")
 
+async def shutdown():
+    """Flush the journal and pending writes, then give up leadership"""
+    try:
+        await journal.close()
+    except Exception as e:
+        logger.error(f"Error closing conversation journal on shutdown: {e}")
+    try:
+        await writer.flush()
+    except Exception as e:
+        logger.error(f"Error flushing pending writes on shutdown: {e}")
+    # Hand the jobs over right away instead of after the lease expires
+    sync_shared_state.cancel()
+    try:
+        await leader.release()
+    except Exception as e:
+        logger.error(f"Error releasing the {leader.name} lease on shutdown: {e}")
+
 # Startup message
 if __name__ == "__main__":
     logger.info('Discord AI Bot started! Ready to respond to mentions...')
-    bot.run(Config.DISCORD_BOT_TOKEN)
+    # Logging is already configured; without log_handler=None discord.py adds a second handler
+    bot.run(Config.DISCORD_BOT_TOKEN, log_handler=None)
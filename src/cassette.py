@@ -0,0 +1,225 @@
+import os
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from config import Config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('cassette')
+
+# Arguments that change how a response is delivered, not what it says
+TRANSPORT_ARGUMENTS = ('stream', 'timeout', 'extra_headers', 'extra_query', 'extra_body')
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when no recorded response matches a request"""
+
+def fingerprint(model, messages, kwargs):
+    """Stable hash of everything that determines a completion's content"""
+    params = {key: value for key, value in kwargs.items() if key not in TRANSPORT_ARGUMENTS}
+    payload = json.dumps({'model': model, 'messages': messages, 'params': params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _dump(model):
+    return model.model_dump(exclude_none=True)
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def chunks_to_response(chunks):
+    """Fold recorded stream chunks into a single completion payload"""
+    first = chunks[0] if chunks else {}
+    content = ''.join(
+        choice.get('delta', {}).get('content') or ''
+        for chunk in chunks for choice in chunk.get('choices', [])
+    )
+    return {
+        'id': first.get('id', 'cassette'),
+        'object': 'chat.completion',
+        'created': first.get('created', 0),
+        'model': first.get('model', ''),
+        'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}]
+    }
+
+def response_to_chunks(response):
+    """Split a recorded completion payload into a one-chunk stream"""
+    message = response['choices'][0].get('message', {}) if response.get('choices') else {}
+    return [{
+        'id': response.get('id', 'cassette'),
+        'object': 'chat.completion.chunk',
+        'created': response.get('created', 0),
+        'model': response.get('model', ''),
+        'choices': [{
+            'index': 0,
+            'finish_reason': 'stop',
+            'delta': {'role': 'assistant', 'content': message.get('content') or ''}
+        }]
+    }]
+
+class Cassette:
+    """
+    Records chat completions (request fingerprint, task, response or stream chunks,
+    latency) as JSON lines, gzipped when the path ends in .gz, and replays them.
+    Replay matches on the request fingerprint, repeating the last match once its
+    recordings are used up. With task_fallback, an unmatched request gets a
+    recording of the same task chosen by its fingerprint, so prompts that differ
+    slightly between runs (timestamps, random formats) still get production-shaped
+    responses, mapped the same way whatever order requests arrive in.
+    """
+
+    def __init__(self, mode='off', path='src/db/cassettes/llm_cassette.jsonl.gz', realtime=False, task_fallback=False):
+        self.mode = mode
+        self.path = path
+        self.realtime = realtime
+        self.task_fallback = task_fallback
+        self.hits = 0
+        self.fallbacks = 0
+        self.misses = 0
+        self.recorded = 0
+        self._write_lock = threading.Lock()
+        self._records = None
+        self._by_key = None
+        self._by_task = None
+
+    @property
+    def recording(self):
+        return self.mode == 'record'
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    # Recording
+
+    def _append(self, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self._write_lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            # Each append adds a gzip member; readers see one continuous stream
+            with _open(self.path, 'a') as f:
+                f.write(line)
+        self.recorded += 1
+
+    async def _save(self, task, key, seconds, response=None, chunks=None):
+        record = {'task': task, 'key': key, 'seconds': round(seconds, 4)}
+        if chunks is not None:
+            record['chunks'] = chunks
+        else:
+            record['response'] = response
+        try:
+            await asyncio.to_thread(self._append, record)
+        except Exception as e:
+            logger.error(f"Error writing cassette record: {e}")
+
+    async def record(self, task, model, messages, kwargs, response, started):
+        """Save a completion and hand it back; streams are recorded as they are consumed"""
+        key = fingerprint(model, messages, kwargs)
+        if not kwargs.get('stream'):
+            await self._save(task, key, time.perf_counter() - started, response=_dump(response))
+            return response
+        return self._record_stream(task, key, response, started)
+
+    async def _record_stream(self, task, key, stream, started):
+        chunks = []
+        async for chunk in stream:
+            chunks.append(_dump(chunk))
+            yield chunk
+        await self._save(task, key, time.perf_counter() - started, chunks=chunks)
+
+    # Replay
+
+    def _load(self):
+        self._records = []
+        self._by_key = defaultdict(list)
+        self._by_task = defaultdict(list)
+        try:
+            with _open(self.path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        self._records.append(json.loads(line))
+        except FileNotFoundError:
+            logger.error(f"Cassette {self.path} does not exist, every request will miss")
+        for index, record in enumerate(self._records):
+            record['used'] = False
+            self._by_key[record['key']].append(index)
+            self._by_task[record['task']].append(index)
+        logger.info(f"Loaded {len(self._records)} recorded completions from {self.path}")
+
+    def _take(self, indices):
+        for index in indices:
+            record = self._records[index]
+            if not record['used']:
+                record['used'] = True
+                return record
+        return None
+
+    def _find(self, task, key):
+        if self._records is None:
+            self._load()
+        record = self._take(self._by_key.get(key, ()))
+        if record is not None:
+            self.hits += 1
+            return record
+        # Everything for this key was served already: repeat the last exact match
+        indices = self._by_key.get(key)
+        if indices:
+            self.hits += 1
+            return self._records[indices[-1]]
+        indices = self._by_task.get(task)
+        if self.task_fallback and indices:
+            self.fallbacks += 1
+            logger.debug(f"No exact cassette match for {task}, serving a {task} recording picked by fingerprint")
+            return self._records[indices[int(key, 16) % len(indices)]]
+        self.misses += 1
+        raise CassetteMiss(f"No recorded completion for task {task}")
+
+    async def replay(self, task, model, messages, kwargs):
+        """Serve a recorded completion as a ChatCompletion, or a chunk stream if stream=True"""
+        record = self._find(task, fingerprint(model, messages, kwargs))
+        if self.realtime and not kwargs.get('stream'):
+            await asyncio.sleep(record['seconds'])
+        if kwargs.get('stream'):
+            chunks = record['chunks'] if 'chunks' in record else response_to_chunks(record['response'])
+            return self._replay_stream(chunks, record['seconds'])
+        response = record['response'] if 'response' in record else chunks_to_response(record['chunks'])
+        return ChatCompletion(**response)
+
+    async def _replay_stream(self, chunks, seconds):
+        delay = seconds / len(chunks) if self.realtime and chunks else 0
+        for chunk in chunks:
+            if delay:
+                await asyncio.sleep(delay)
+            yield ChatCompletionChunk(**chunk)
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'recorded': self.recorded,
+            'hits': self.hits,
+            'fallbacks': self.fallbacks,
+            'misses': self.misses
+        }
+
+_cassette = None
+
+def get_cassette():
+    """Return the cassette configured by LLM_CASSETTE_MODE, creating it on first use"""
+    global _cassette
+    if _cassette is None:
+        _cassette = Cassette(
+            Config.LLM_CASSETTE_MODE,
+            Config.LLM_CASSETTE_PATH,
+            Config.LLM_CASSETTE_REALTIME,
+            Config.LLM_CASSETTE_TASK_FALLBACK
+        )
+        if _cassette.mode != 'off':
+            logger.info(f"LLM cassette in {_cassette.mode} mode ({_cassette.path})")
+    return _cassette
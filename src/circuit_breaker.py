@@ -0,0 +1,72 @@
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('circuit_breaker')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an endpoint whose circuit is open"""
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failed or slow calls, so callers
+    fail fast instead of waiting on a degraded endpoint. After reset_timeout
+    one probe call is let through (half-open); its outcome closes the circuit
+    or opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def is_open(self):
+        """True while calls would be refused (open and not yet due for a probe)"""
+        if self.state == OPEN:
+            return time.monotonic() - self._opened_at < self.reset_timeout
+        return self.state == HALF_OPEN and self._probing
+
+    def allow(self):
+        """Return True if a call may go through now; claims the probe slot when half-open"""
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record(self, success, seconds=None, slow_after=None):
+        """Record a call's outcome; a call slower than slow_after counts as a failure"""
+        if success and slow_after is not None and seconds is not None and seconds > slow_after:
+            success = False
+        if success:
+            if self.state != CLOSED:
+                logger.info(f"Circuit {self.name} closed")
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+            return
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(f"Circuit {self.name} opened after {self.failures} failed or slow calls")
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+    def cancel_probe(self):
+        """Give back the probe slot when the probe call ended without an outcome"""
+        self._probing = False
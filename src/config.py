@@ -18,3 +18,136 @@ class Config:
     
     # AI Model to use
     AI_MODEL = os.getenv('AI_MODEL', 'hf:google/gemma-2-9b-it')
+    
+    # OpenAI-compatible API endpoint
+    LLM_API_BASE = os.getenv('LLM_API_BASE', 'https://glhf.chat/api/openai/v1')
+    
+    # Shared LLM connection pool limits and timeouts (seconds)
+    LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+    LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '10'))
+    LLM_KEEPALIVE_EXPIRY = float(os.getenv('LLM_KEEPALIVE_EXPIRY', '60'))
+    LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '120'))
+    LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '10'))
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+    
+    # Memory selection mode: 'local' (in-process BM25) or 'llm' (model-picked)
+    MEMORY_SELECTION_MODE = os.getenv('MEMORY_SELECTION_MODE', 'local')
+    
+    # Number of memories the local retriever returns per message
+    MEMORY_TOP_K = int(os.getenv('MEMORY_TOP_K', '3'))
+    
+    # Seconds between mtime checks of memories.json; reads in between are served from memory
+    MEMORY_STORE_CHECK_INTERVAL = float(os.getenv('MEMORY_STORE_CHECK_INTERVAL', '5'))
+    
+    # Per-stage deadlines (seconds) before a reply proceeds without that stage's output
+    MEMORY_STAGE_TIMEOUT = float(os.getenv('MEMORY_STAGE_TIMEOUT', '1.5'))
+    # MEMORY_SELECTION_MODE=llm waits on a completion; keep this at or above the memory_select route timeout
+    MEMORY_LLM_STAGE_TIMEOUT = float(os.getenv('MEMORY_LLM_STAGE_TIMEOUT', '10'))
+    NARRATIVE_STAGE_TIMEOUT = float(os.getenv('NARRATIVE_STAGE_TIMEOUT', '0.5'))
+    
+    # Stream replies: post after the first sentence, then edit as tokens arrive
+    STREAM_REPLIES = os.getenv('STREAM_REPLIES', 'false').lower() == 'true'
+    
+    # Minimum seconds between edits of a streamed reply (Discord allows ~5 edits per 5s)
+    STREAM_EDIT_INTERVAL = float(os.getenv('STREAM_EDIT_INTERVAL', '1.2'))
+    
+    # Mention handling: number of concurrent workers and max queued mentions before shedding
+    MENTION_WORKERS = int(os.getenv('MENTION_WORKERS', '4'))
+    MENTION_QUEUE_DEPTH = int(os.getenv('MENTION_QUEUE_DEPTH', '50'))
+    
+    # Memory selection cache: max entries and seconds before an entry expires
+    MEMORY_CACHE_SIZE = int(os.getenv('MEMORY_CACHE_SIZE', '1024'))
+    MEMORY_CACHE_TTL = float(os.getenv('MEMORY_CACHE_TTL', '600'))
+    
+    # Token budgets for the variable parts of the reply prompt and for memory lists in prompts
+    REPLY_PROMPT_BUDGET = int(os.getenv('REPLY_PROMPT_BUDGET', '1500'))
+    MEMORY_PROMPT_BUDGET = int(os.getenv('MEMORY_PROMPT_BUDGET', '2000'))
+    
+    # Nightly memory analysis: split conversations into chunks analyzed concurrently
+    NIGHTLY_MAP_REDUCE = os.getenv('NIGHTLY_MAP_REDUCE', 'true').lower() == 'true'
+    NIGHTLY_CHUNK_TOKENS = int(os.getenv('NIGHTLY_CHUNK_TOKENS', '3000'))
+    NIGHTLY_CONCURRENCY = int(os.getenv('NIGHTLY_CONCURRENCY', '4'))
+    
+    # Seconds between flushes of the conversation journal to disk
+    JOURNAL_FLUSH_INTERVAL = float(os.getenv('JOURNAL_FLUSH_INTERVAL', '5'))
+    # Days processed journal files are kept before nightly processing deletes them
+    JOURNAL_RETENTION_DAYS = float(os.getenv('JOURNAL_RETENTION_DAYS', '7'))
+    
+    # Estimated Jaccard similarity of content words and word pairs at which a new memory
+    # counts as a near-duplicate; high, since memories a word apart can be different facts
+    MEMORY_DEDUP_THRESHOLD = float(os.getenv('MEMORY_DEDUP_THRESHOLD', '0.9'))
+    
+    # Pre-generate the next story phase in the background while the current one still has events
+    NARRATIVE_LOOKAHEAD = os.getenv('NARRATIVE_LOOKAHEAD', 'true').lower() == 'true'
+    
+    # Circles memory tiers: circles kept verbatim, extra circles per epoch fold,
+    # max epoch summaries before they are folded together, and prompt token budget
+    CIRCLES_RECENT_LIMIT = int(os.getenv('CIRCLES_RECENT_LIMIT', '4'))
+    CIRCLES_FOLD_BATCH = int(os.getenv('CIRCLES_FOLD_BATCH', '4'))
+    CIRCLES_EPOCH_LIMIT = int(os.getenv('CIRCLES_EPOCH_LIMIT', '4'))
+    CIRCLES_PROMPT_BUDGET = int(os.getenv('CIRCLES_PROMPT_BUDGET', '3000'))
+    
+    # Retries (with exponential backoff, in seconds) when a model returns unusable JSON
+    JSON_MAX_RETRIES = int(os.getenv('JSON_MAX_RETRIES', '2'))
+    JSON_RETRY_BACKOFF = float(os.getenv('JSON_RETRY_BACKOFF', '1'))
+    
+    # Prometheus /metrics endpoint; set METRICS_PORT=0 to disable
+    METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+    METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+    
+    # LLM cassette: 'record' saves every completion to LLM_CASSETTE_PATH, 'replay' serves them back
+    # offline (LLM_CASSETTE_REALTIME replays the recorded latency too), 'off' disables it
+    LLM_CASSETTE_MODE = os.getenv('LLM_CASSETTE_MODE', 'off').lower()
+    LLM_CASSETTE_PATH = os.getenv('LLM_CASSETTE_PATH', 'src/db/cassettes/llm_cassette.jsonl.gz')
+    LLM_CASSETTE_REALTIME = os.getenv('LLM_CASSETTE_REALTIME', 'false').lower() == 'true'
+    # Serve unmatched requests a recording of the same task (counted as fallbacks) instead of missing
+    LLM_CASSETTE_TASK_FALLBACK = os.getenv('LLM_CASSETTE_TASK_FALLBACK', 'false').lower() == 'true'
+    
+    # Logging: level, 'text' or 'json' records, listener queue size, and per-event
+    # sampling rates ('event=rate,...'); events not listed are always logged
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', 'mention_received=0.1,reply_inputs=0.1,reply_sent=0.1,mention_shed=0.1')
+    
+    # Reply prompt layout: 'inline' mixes everything into the user turn, 'prefix' puts the
+    # slow-changing system/style/narrative text first so provider prefix caches can hit
+    PROMPT_LAYOUT = os.getenv('PROMPT_LAYOUT', 'inline').lower()
+    
+    # Sharding: total gateway shards, and the shard ids this process runs (comma-separated,
+    # empty for all). With SHARD_COUNT > 1 the bot runs as an AutoShardedBot
+    SHARD_COUNT = int(os.getenv('SHARD_COUNT', '1'))
+    SHARD_IDS = [int(shard) for shard in os.getenv('SHARD_IDS', '').split(',') if shard.strip()]
+    
+    # Shared state for conversation history, narrative context and job leadership:
+    # 'memory' (single process), 'sqlite' (WAL, shared by local processes) or 'module:Class'
+    STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory')
+    STATE_BACKEND_PATH = os.getenv('STATE_BACKEND_PATH', 'src/db/state.sqlite3')
+    
+    # Seconds a leader lease lasts (renewed every third of that) and between narrative syncs
+    LEADER_LEASE_TTL = float(os.getenv('LEADER_LEASE_TTL', '30'))
+    
+    # Per-task model routes (model, endpoint, max_tokens, timeout, latency budget, fallback)
+    # and seconds a task stays on its fallback after its primary model ran over budget
+    MODEL_ROUTES_PATH = os.getenv('MODEL_ROUTES_PATH', 'src/model_routes.json')
+    MODEL_FALLBACK_COOLDOWN = float(os.getenv('MODEL_FALLBACK_COOLDOWN', '300'))
+    
+    # Hedged requests: for these tasks (comma-separated, e.g. 'reply'), fire a second request
+    # when the first has not answered after the task's HEDGE_PERCENTILE latency (at least
+    # HEDGE_MIN_DELAY seconds), optionally to another endpoint/model; the first to finish wins
+    HEDGE_TASKS = [task.strip() for task in os.getenv('HEDGE_TASKS', '').split(',') if task.strip()]
+    HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '0.95'))
+    HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', '1'))
+    HEDGE_BASE_URL = os.getenv('HEDGE_BASE_URL', '')
+    HEDGE_MODEL = os.getenv('HEDGE_MODEL', '')
+    
+    # Circuit breaker per model/endpoint: consecutive failed or over-budget calls before it
+    # opens, and seconds before a probe call is let through
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+    BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', '30'))
+    
+    # In-character replies served while the circuit is open: replies per format, seconds
+    # between background refreshes, and where the pool is persisted
+    FALLBACK_REPLIES_PER_FORMAT = int(os.getenv('FALLBACK_REPLIES_PER_FORMAT', '3'))
+    FALLBACK_REFRESH_INTERVAL = float(os.getenv('FALLBACK_REFRESH_INTERVAL', '600'))
+    FALLBACK_REPLIES_PATH = os.getenv('FALLBACK_REPLIES_PATH', 'src/db/fallback_replies.json')
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from datetime import date
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('conversation_journal')
+
+JOURNAL_DIR = 'src/db/journal'
+CLAIMED_SUFFIX = '.claimed'
+PROCESSED_SUFFIX = '.processed'
+
+class ConversationJournal:
+    """
+    Append-only JSONL journal of the day's conversations.
+    Messages are buffered in memory and appended to one file per day from a
+    worker thread, so nightly processing sees every exchange and a restart
+    loses at most one flush interval. Processes sharing a directory pass
+    distinct names so each appends to its own files.
+    """
+
+    def __init__(self, directory=JOURNAL_DIR, flush_interval=5.0, max_buffer=200, name=''):
+        self.directory = directory
+        self.name = name
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._flush_lock = None
+        self._task = None
+
+    def append(self, user_id, content, is_bot):
+        """Buffer one message; flushed to disk by the background task"""
+        self._buffer.append({
+            'day': date.today().isoformat(),
+            'user_id': user_id,
+            'content': content,
+            'is_bot': is_bot,
+            'timestamp': time.time()
+        })
+        if len(self._buffer) >= self.max_buffer and self._task is not None:
+            asyncio.create_task(self.flush())
+
+    def start(self):
+        """Start the periodic flush task on the running loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Stop the flush task and write out anything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def _lock(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        return self._flush_lock
+
+    async def flush(self):
+        """Append buffered messages to their day files without blocking the loop"""
+        async with self._lock():
+            await self._flush_buffer()
+
+    async def _flush_buffer(self):
+        if not self._buffer:
+            return
+        records, self._buffer = self._buffer, []
+        try:
+            await asyncio.to_thread(self._write, records)
+        except Exception as e:
+            logger.error(f"Error flushing conversation journal: {e}")
+            # Keep the records for the next attempt
+            self._buffer = records + self._buffer
+
+    def _write(self, records):
+        os.makedirs(self.directory, exist_ok=True)
+        by_day = {}
+        for record in records:
+            by_day.setdefault(record['day'], []).append(record)
+        for day, day_records in by_day.items():
+            filename = f"{day}-{self.name}.jsonl" if self.name else f"{day}.jsonl"
+            with open(os.path.join(self.directory, filename), 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in day_records)
+                f.flush()
+                os.fsync(f.fileno())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def claim_pending(self):
+        """
+        Flush, then set aside every unprocessed journal file for nightly processing.
+        Messages arriving afterwards start a fresh file, so nothing is marked processed
+        without being read. Files claimed by an earlier failed run are included again.
+        """
+        async with self._lock():
+            await self._flush_buffer()
+            return await asyncio.to_thread(self._claim)
+
+    def _claim(self):
+        if not os.path.isdir(self.directory):
+            return []
+        stamp = int(time.time())
+        claimed = []
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.jsonl'):
+                claimed_path = f"{path}.{stamp}{CLAIMED_SUFFIX}"
+                os.replace(path, claimed_path)
+                claimed.append(claimed_path)
+            elif name.endswith(CLAIMED_SUFFIX):
+                claimed.append(path)
+        return sorted(claimed)
+
+    def iter_records(self, paths):
+        """Stream records from journal files one line at a time"""
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash can leave a partial last line
+                        logger.error(f"Skipping unreadable journal line in {path}")
+
+    def load_conversations(self, paths):
+        """Group journal records into the per-user shape nightly processing expects"""
+        conversations = {}
+        for record in self.iter_records(paths):
+            conversations.setdefault(record['user_id'], []).append({
+                'content': record['content'],
+                'is_bot': record['is_bot'],
+                'timestamp': record['timestamp']
+            })
+        return conversations
+
+    def mark_processed(self, paths):
+        """Rename claimed journal files so they are not analyzed again"""
+        for path in paths:
+            os.replace(path, path[:-len(CLAIMED_SUFFIX)] + PROCESSED_SUFFIX)
+
+    def purge_processed(self, retention_days):
+        """Delete processed journal files last written more than retention_days ago"""
+        if not os.path.isdir(self.directory):
+            return 0
+        cutoff = time.time() - retention_days * 86400
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(PROCESSED_SUFFIX) and os.stat(path).st_mtime < cutoff:
+                os.remove(path)
+                removed += 1
+        return removed
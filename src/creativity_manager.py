@@ -1,16 +1,11 @@
-import openai
 import json
 import logging
-from config import Config
+from llm_gateway import chat_completion
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('creativity_manager')
 
-# Initialize OpenAI
-openai.api_key = Config.OPENAI_API_KEY
-openai.api_base = "https://glhf.chat/api/openai/v1"
-
 CREATIVITY_PROMPT = '''Reason with CREATIVE_STORM, and then based on this profile, the dan harmon's story circle framework and current memories (to avoid circles already told) json, think creatively and create the instructions to make a new story circle with super specific elements of the story for the character:
 
     Character Profile:
@@ -188,17 +183,16 @@ async def generate_creative_instructions(circles_memory):
         )
         
         # Get the creativity instructions from the AI
-        response = await openai.ChatCompletion.acreate(
-            model="hf:nvidia/Llama-3.1-Nemotron-70B-Instruct-HF",
+        response = await chat_completion(
+            task='creative',
             messages=[
                 {"role": "system", "content": formatted_prompt},
                 {"role": "user", "content": "Analyze the previous stories and generate creative instructions for the next story update. Include your reasoning in <CS> tags and your final instructions in <INSTRUCTIONS> tags."}
             ],
-            temperature=0.0,
-            max_tokens=4000
+            temperature=0.0
         )
         
-        response_text = response.choices[0].message['content'].strip()
+        response_text = response.choices[0].message.content.strip()
         
         # Extract instructions from the <INSTRUCTIONS> tags
         import re
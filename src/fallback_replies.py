@@ -0,0 +1,109 @@
+import os
+import json
+import random
+import asyncio
+import logging
+from prompts import FALLBACK_REPLIES_PROMPT, OUTAGE_REPLIES
+from structured_output import StructuredOutputError, complete_json
+from circuit_breaker import CircuitOpenError
+from persistence import writer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('fallback_replies')
+
+FALLBACK_REPLIES_PATH = 'src/db/fallback_replies.json'
+FALLBACK_REPLIES_SCHEMA = {"replies": [str]}
+
+class FallbackReplyPool:
+    """
+    In-character replies per length format, written for the current narrative event.
+    The pool is generated in the background while the model is healthy and served
+    instantly while it is not. It is persisted, so a restart during an outage
+    still has replies, and other processes pick up refreshes from the file.
+    """
+
+    def __init__(self, formats, path=FALLBACK_REPLIES_PATH, per_format=3, concurrency=2):
+        self.formats = list(formats)
+        self.path = path
+        self.per_format = per_format
+        self.concurrency = concurrency
+        # {format: {'event': ..., 'replies': [...]}}
+        self._pool = {}
+        self._mtime = None
+
+    def load(self):
+        """Read the persisted pool if it changed since the last load"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self._pool = json.load(f)['formats']
+            self._mtime = mtime
+        except Exception as e:
+            logger.error(f"Error loading fallback replies: {e}")
+
+    def pick(self, reply_format, event):
+        """A reply for this format and event, else the closest match the pool has"""
+        entry = self._pool.get(reply_format)
+        if entry and entry['event'] == event and entry['replies']:
+            return random.choice(entry['replies'])
+        current = [reply for entry in self._pool.values() if entry['event'] == event for reply in entry['replies']]
+        if current:
+            return random.choice(current)
+        stale = [reply for entry in self._pool.values() for reply in entry['replies']]
+        return random.choice(stale or OUTAGE_REPLIES)
+
+    def contains(self, text):
+        """True if text is one of the fallback replies"""
+        return text in OUTAGE_REPLIES or any(text in entry['replies'] for entry in self._pool.values())
+
+    async def _generate(self, reply_format, event):
+        result = await complete_json(
+            messages=[
+                {"role": "system", "content": FALLBACK_REPLIES_PROMPT.format(
+                    count=self.per_format, format=reply_format, event=event or "nothing special"
+                )},
+                {"role": "user", "content": f"Write the {self.per_format} replies now."}
+            ],
+            schema=FALLBACK_REPLIES_SCHEMA,
+            retries=0,
+            task='fallback_pool',
+            temperature=0.9
+        )
+        replies = [reply.strip() for reply in result['replies'] if reply.strip()]
+        if not replies:
+            raise StructuredOutputError("$.replies is empty")
+        return replies[:self.per_format]
+
+    async def refresh(self, event):
+        """Generate replies for every format that has none for the current event"""
+        stale = [
+            reply_format for reply_format in self.formats
+            if self._pool.get(reply_format, {}).get('event') != event
+        ]
+        if not stale:
+            return 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+        refreshed = 0
+
+        async def refresh_format(reply_format):
+            nonlocal refreshed
+            async with semaphore:
+                replies = await self._generate(reply_format, event)
+            self._pool[reply_format] = {'event': event, 'replies': replies}
+            refreshed += 1
+
+        results = await asyncio.gather(*(refresh_format(f) for f in stale), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            level = logging.WARNING if all(isinstance(e, CircuitOpenError) for e in errors) else logging.ERROR
+            logger.log(level, "Could not refresh %d fallback reply formats: %s", len(errors), errors[0])
+        if refreshed:
+            writer.schedule(self.path, {'formats': self._pool})
+            logger.info(f"Refreshed fallback replies for {refreshed} of {len(stale)} formats")
+        return refreshed
@@ -0,0 +1,191 @@
+import time
+import httpx
+import asyncio
+import logging
+from openai import AsyncOpenAI
+from config import Config
+from cassette import get_cassette
+from model_router import get_router
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from metrics import BREAKER_STATE, LLM_ERRORS, LLM_HEDGES, LLM_SECONDS, record_usage
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('llm_gateway')
+
+# One pooled keep-alive HTTP session shared by every client
+_http_client = None
+_clients = {}
+
+# One circuit breaker per model and endpoint
+_breakers = {}
+BREAKER_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+def get_http_client():
+    """Return the shared pooled HTTP client, creating it on first use"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=Config.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=Config.LLM_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(Config.LLM_TIMEOUT, connect=Config.LLM_CONNECT_TIMEOUT)
+        )
+        _clients.clear()
+        logger.info(
+            f"Created LLM connection pool (max {Config.LLM_MAX_CONNECTIONS} connections, "
+            f"{Config.LLM_MAX_KEEPALIVE_CONNECTIONS} keep-alive)"
+        )
+    return _http_client
+
+def get_client(base_url=None):
+    """Return the async API client for an endpoint, sharing the pooled session"""
+    http_client = get_http_client()
+    base_url = base_url or Config.LLM_API_BASE
+    client = _clients.get(base_url)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=Config.OPENAI_API_KEY,
+            base_url=base_url,
+            http_client=http_client,
+            max_retries=Config.LLM_MAX_RETRIES
+        )
+        _clients[base_url] = client
+    return client
+
+def get_breaker(model, base_url):
+    """Return the circuit breaker guarding a model on an endpoint"""
+    name = f"{model}@{base_url}"
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(
+            name,
+            failure_threshold=Config.BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=Config.BREAKER_RESET_TIMEOUT
+        )
+        BREAKER_STATE.set_function(lambda: BREAKER_STATE_VALUES[breaker.state], circuit=name)
+    return breaker
+
+def circuit_open(task='default'):
+    """True while calls for task would be refused without reaching the model"""
+    _, route = get_router().resolve(task)
+    return get_breaker(route['model'], route['base_url']).is_open
+
+def hedge_delay(task):
+    """Seconds to wait for the primary before hedging: the task's latency percentile, floored"""
+    observed = LLM_SECONDS.percentile(Config.HEDGE_PERCENTILE, task=task)
+    return max(observed or 0.0, Config.HEDGE_MIN_DELAY)
+
+async def _discard(task):
+    """Cancel a losing request, closing its stream if it already opened one"""
+    if not task.done():
+        task.cancel()
+        return
+    if task.cancelled() or task.exception() is not None:
+        return
+    response = getattr(task.result(), 'response', None)
+    if response is not None:
+        await response.aclose()
+
+async def hedged(task, primary_call, hedge_call, delay):
+    """
+    Run primary_call; if it has not finished after delay seconds, also run
+    hedge_call. The first to succeed wins and the other is cancelled.
+    """
+    primary = asyncio.ensure_future(primary_call())
+    pending = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return primary.result()
+        LLM_HEDGES.inc(task=task, outcome='fired')
+        hedge = asyncio.ensure_future(hedge_call())
+        pending.add(hedge)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winners = [request for request in done if request.exception() is None]
+            if winners:
+                winner = primary if primary in winners else winners[0]
+                LLM_HEDGES.inc(task=task, outcome='primary_won' if winner is primary else 'hedge_won')
+                for request in (primary, hedge):
+                    if request is not winner:
+                        await _discard(request)
+                return winner.result()
+        LLM_HEDGES.inc(task=task, outcome='both_failed')
+        return primary.result()
+    finally:
+        for request in pending:
+            request.cancel()
+
+async def chat_completion(messages, model=None, base_url=None, task='default', **kwargs):
+    """
+    Create a chat completion through the shared gateway.
+    Accepts the usual completion arguments (temperature, max_tokens, stream, timeout, ...).
+    With stream=True the result is an async iterator of chunks.
+    task names the caller for metrics and cassette recordings, and picks its route:
+    the model, endpoint, max_tokens and timeout unless given explicitly.
+    """
+    router = get_router()
+    tier, route = router.resolve(task)
+    model = model or route['model']
+    base_url = base_url or route['base_url']
+    for field in ('max_tokens', 'timeout'):
+        if route[field] is not None:
+            kwargs.setdefault(field, route[field])
+    cassette = get_cassette()
+    breaker = None if cassette.replaying else get_breaker(model, base_url)
+    if breaker is not None and not breaker.allow():
+        LLM_ERRORS.inc(task=task)
+        raise CircuitOpenError(f"Circuit {breaker.name} is open")
+    started = time.perf_counter()
+    succeeded = None
+    try:
+        if cassette.replaying:
+            response = await cassette.replay(task, model, messages, kwargs)
+        else:
+            def create(endpoint, model_name):
+                return lambda: get_client(endpoint).chat.completions.create(
+                    model=model_name,
+                    messages=messages,
+                    **kwargs
+                )
+            if task in Config.HEDGE_TASKS:
+                response = await hedged(
+                    task,
+                    create(base_url, model),
+                    create(Config.HEDGE_BASE_URL or base_url, Config.HEDGE_MODEL or model),
+                    hedge_delay(task)
+                )
+            else:
+                response = await create(base_url, model)()
+        succeeded = True
+    except Exception:
+        succeeded = False
+        LLM_ERRORS.inc(task=task)
+        raise
+    finally:
+        # For streams this is the time until the stream opened
+        elapsed = time.perf_counter() - started
+        LLM_SECONDS.observe(elapsed, task=task)
+        router.observe(task, tier, elapsed, succeeded is False)
+        if breaker is not None:
+            if succeeded is None:
+                # Cancelled: no verdict on the endpoint
+                breaker.cancel_probe()
+            else:
+                breaker.record(succeeded, elapsed, route['latency_budget'])
+    if not kwargs.get('stream'):
+        record_usage(task, response)
+    if cassette.recording:
+        response = await cassette.record(task, model, messages, kwargs, response, started)
+    return response
+
+async def close():
+    """Close the pooled HTTP session"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+        _clients.clear()
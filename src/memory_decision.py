@@ -1,15 +1,25 @@
-import json
-import openai
+import re
+import asyncio
 import logging
 from config import Config
+from structured_output import StructuredOutputError, complete_json
+from memory_retrieval import retrieve_memories
+from memory_store import memory_store
+from ttl_cache import TTLCache
+from metrics import MEMORY_CACHE
+from prompt_budget import compact_json, pack_items
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('memory_decision')
 
-# Initialize OpenAI
-openai.api_key = Config.OPENAI_API_KEY
-openai.api_base = "https://glhf.chat/api/openai/v1"
+# Selection results keyed on the normalized message and the memory store version
+selection_cache = TTLCache(
+    maxsize=Config.MEMORY_CACHE_SIZE,
+    ttl=Config.MEMORY_CACHE_TTL
+)
+for stat in ('hits', 'misses', 'size'):
+    MEMORY_CACHE.set_function(lambda stat=stat: selection_cache.stats()[stat], stat=stat)
 
 MEMORY_SELECTION_PROMPT = """Given the user's message and identity, select the most relevant memories that would help craft a meaningful response aligned with the character's personality (a whimsical, innocent frog-like being).
 
@@ -34,55 +44,85 @@ Selection criteria:
 4. Prioritize recent and emotionally significant memories
 5. Consider the user's history and relationship context"""
 
+MEMORY_SELECTION_SCHEMA = {"selected_memories": [str]}
+
+def normalize_message(user_message: str) -> str:
+    """Normalize a message so trivially different repeats share a cache entry"""
+    return " ".join(re.sub(r"[^\w$\s]", " ", user_message.lower()).split())
+
 async def select_relevant_memories(user_identifier: str, user_message: str) -> str:
     """
     Select relevant memories based on the current conversation context.
     Returns a comma-separated string of relevant memories.
     """
     try:
-        # Read all available memories
-        with open('memories.json', 'r') as f:
-            all_memories = json.load(f)['memories']
+        # Read all available memories from the shared cache
+        version, all_memories = memory_store.snapshot()
+        
+        # Repeat messages are served from the cache; a new store version misses automatically
+        mode = Config.MEMORY_SELECTION_MODE
+        cache_key = (mode, version, normalize_message(user_message))
+        if mode == 'llm':
+            # The model also sees who is asking, so its picks are per user
+            cache_key += (user_identifier,)
+        cached = selection_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        if mode == 'llm':
+            memory_string = await select_memories_with_llm(all_memories, user_identifier, user_message)
+            if not memory_string:
+                # Empty may mean the call failed, so do not pin it in the cache
+                return memory_string
+        else:
+            # Score off the event loop so a large memory list cannot stall other messages
+            memory_string = await asyncio.to_thread(
+                retrieve_memories,
+                all_memories,
+                user_message,
+                k=Config.MEMORY_TOP_K,
+                version=version
+            )
         
+        selection_cache.set(cache_key, memory_string)
+        return memory_string
+        
+    except Exception as e:
+        logger.error(f"Error in select_relevant_memories: {e}")
+        return ""
+
+async def select_memories_with_llm(all_memories, user_identifier: str, user_message: str) -> str:
+    """Ask the model to pick relevant memories (opt-in, costs a completion per message)"""
+    try:
         # Prepare prompt
         prompt = MEMORY_SELECTION_PROMPT.format(
             user_identifier=user_identifier,
             user_message=user_message,
-            all_memories=json.dumps(all_memories, indent=2)
-        )
-        
-        # Get memory selection from AI
-        response = await openai.ChatCompletion.acreate(
-            model=Config.AI_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a precise memory selection tool that MUST respond with ONLY valid JSON format."
-                },
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.0,
-            max_tokens=100
+            all_memories=compact_json(pack_items(list(all_memories), Config.MEMORY_PROMPT_BUDGET))
         )
         
-        # Parse response
-        content = response.choices[0].message['content']
-        cleaned_content = content.strip()
-        if cleaned_content.startswith("```json"):
-            cleaned_content = cleaned_content[7:]
-        if cleaned_content.endswith("```"):
-            cleaned_content = cleaned_content[:-3]
-        cleaned_content = cleaned_content.strip()
-        
+        # Get memory selection from AI; no retries, this sits on the reply path
         try:
-            analysis = json.loads(cleaned_content)
-            # Convert selected memories directly to comma-separated string
-            memory_string = ", ".join(analysis['selected_memories'])
-            return memory_string
-        except json.JSONDecodeError as e:
+            analysis = await complete_json(
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are a precise memory selection tool that MUST respond with ONLY valid JSON format."
+                    },
+                    {"role": "user", "content": prompt}
+                ],
+                schema=MEMORY_SELECTION_SCHEMA,
+                retries=0,
+                task='memory_select',
+                temperature=0.0
+            )
+        except StructuredOutputError as e:
             logger.error(f"JSON Parse Error: {e}")
             return ""
         
+        # Convert selected memories directly to comma-separated string
+        return ", ".join(analysis['selected_memories'])
+        
     except Exception as e:
-        logger.error(f"Error in select_relevant_memories: {e}")
+        logger.error(f"Error in select_memories_with_llm: {e}")
         return "" 
\ No newline at end of file
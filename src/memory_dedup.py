@@ -0,0 +1,114 @@
+import re
+import sys
+import json
+import random
+import hashlib
+import logging
+import argparse
+from memory_retrieval import STOPWORDS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('memory_dedup')
+
+NUM_PERMUTATIONS = 128
+MERSENNE_PRIME = (1 << 61) - 1
+
+# Fixed seed so signatures are stable across runs
+_rng = random.Random(1308084069)
+_PERMUTATIONS = [
+    (_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+def normalize(text):
+    """Lowercase and strip punctuation so formatting differences do not matter"""
+    return " ".join(re.sub(r"[^\w$\s]", " ", text.lower()).split())
+
+def fwog_spelling(word):
+    """Map r and l to w, so 'learned' and 'weawned' are the same word"""
+    return word.replace('r', 'w').replace('l', 'w')
+
+# Filler words carry no meaning of their own, in either spelling
+DEDUP_STOPWORDS = frozenset(
+    fwog_spelling(word) for word in STOPWORDS | {'in', 'dat', 'da', 'now', 'out', 'about'}
+)
+
+def shingles(text):
+    """Content words of the normalized text in fwog spelling, plus adjacent word pairs so order counts"""
+    words = [
+        word for word in (fwog_spelling(word) for word in normalize(text).split() if len(word) > 1)
+        if word not in DEDUP_STOPWORDS
+    ]
+    if not words:
+        return {normalize(text)}
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+def minhash(text):
+    """MinHash signature estimating the shingle set of text"""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+        for shingle in shingles(text)
+    ]
+    return tuple(
+        min((a * h + b) % MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+def similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity of two signatures"""
+    matches = sum(1 for a, b in zip(signature_a, signature_b) if a == b)
+    return matches / len(signature_a)
+
+def merge_memories(existing, new_memories, threshold=0.9):
+    """
+    Add new memories to existing ones, skipping near-duplicates.
+    Stored memories are never overwritten: memories differing in one word
+    can state different facts. Returns (memories, added, rejected).
+    """
+    memories = list(existing)
+    signatures = [minhash(memory) for memory in memories]
+    added = rejected = 0
+    for memory in new_memories:
+        signature = minhash(memory)
+        best_index, best_score = None, 0.0
+        for index, other in enumerate(signatures):
+            score = similarity(signature, other)
+            if score > best_score:
+                best_index, best_score = index, score
+        if best_index is not None and best_score >= threshold:
+            rejected += 1
+            logger.info(f"Near-duplicate memory ({best_score:.2f}) of {memories[best_index]!r}: {memory}")
+            continue
+        memories.append(memory)
+        signatures.append(signature)
+        added += 1
+    return memories, added, rejected
+
+def compact_memories(memories, threshold=0.9):
+    """Rebuild a memory list with near-duplicates folded together"""
+    compacted, _, rejected = merge_memories([], memories, threshold)
+    return compacted, rejected
+
+def main(argv=None):
+    """Offline compaction of memories.json: python src/memory_dedup.py [--threshold 0.9] [--dry-run]"""
+    from persistence import atomic_write_json
+
+    parser = argparse.ArgumentParser(description="Fold near-duplicate memories in memories.json")
+    parser.add_argument('--path', default='memories.json')
+    parser.add_argument('--threshold', type=float, default=0.9,
+                        help="estimated Jaccard similarity of content words and word pairs at which two memories count as duplicates")
+    parser.add_argument('--dry-run', action='store_true', help="report without writing")
+    args = parser.parse_args(argv)
+
+    with open(args.path, 'r') as f:
+        data = json.load(f)
+    compacted, removed = compact_memories(data['memories'], args.threshold)
+    print(f"{len(data['memories'])} memories -> {len(compacted)} ({removed} near-duplicates folded)")
+    if removed and not args.dry_run:
+        data['memories'] = compacted
+        atomic_write_json(args.path, data, indent=4)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,16 @@
-import json
-from openai import OpenAI
 import asyncio
 from datetime import datetime
 from config import Config
+from structured_output import StructuredOutputError, complete_json
 import logging
+from memory_store import memory_store
+from memory_dedup import fwog_spelling, merge_memories, normalize
+from prompt_budget import compact_json, count_tokens, pack_items, truncate_to_tokens
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('memory_processor')
 
-# Initialize OpenAI client
-client = OpenAI(
-    api_key=Config.OPENAI_API_KEY,
-    base_url="https://glhf.chat/api/openai/v1"
-)
-
 MEMORY_ANALYSIS_PROMPT = """Analyze the following conversations and extract topics and summaries in JSON format. 
 Compare these with existing memories to determine if they're new and relevant for the character (a whimsical, innocent frog-like being).
 
@@ -46,25 +42,28 @@ Rules for relevancy:
 6. Should be something super detailed and specific from the conversations, otherwise mark it as irrelevant
 """
 
-async def analyze_daily_conversations(user_conversations):
+MEMORY_ANALYSIS_SCHEMA = {
+    "topics": [
+        {
+            "topic": str,
+            "summary": str,
+            "exists": bool,
+            "relevant": bool
+        }
+    ]
+}
+
+async def analyze_conversation_chunk(formatted_conversations, existing_memories):
+    """Analyze one block of formatted conversations against the existing memories"""
+    # Prepare prompt with existing memories
+    prompt = MEMORY_ANALYSIS_PROMPT.format(
+        existing_memories=existing_memories,
+        conversations=formatted_conversations
+    )
+    
+    # Get the analysis, retrying with a repair hint if the JSON is unusable
     try:
-        # Read existing memories
-        with open('memories.json', 'r') as f:
-            existing_memories = json.load(f)['memories']
-        
-        # Format conversations for analysis
-        formatted_conversations = format_conversations(user_conversations)
-        
-        # Prepare prompt with existing memories
-        prompt = MEMORY_ANALYSIS_PROMPT.format(
-            existing_memories=json.dumps(existing_memories, indent=2),
-            conversations=formatted_conversations
-        )
-        
-        # Get analysis from Nemotron using new SDK syntax
-        response = await asyncio.to_thread(
-            client.chat.completions.create,
-            model="hf:nvidia/Llama-3.1-Nemotron-70B-Instruct-HF",
+        return await complete_json(
             messages=[
                 {
                     "role": "system", 
@@ -75,40 +74,62 @@ async def analyze_daily_conversations(user_conversations):
                 },
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.0,
-            max_tokens=1000
+            schema=MEMORY_ANALYSIS_SCHEMA,
+            task='nightly_analysis',
+            temperature=0.0
         )
+    except StructuredOutputError as json_err:
+        logger.error(f"JSON Parse Error: {json_err}")
+        # Provide a fallback analysis if parsing fails
+        return {
+            "topics": [
+                {
+                    "topic": "conversation_parse_error",
+                    "summary": "had twouble understanding the convewsation today... maybe twy again tomowwow?",
+                    "exists": False,
+                    "relevant": False,
+                    "reasoning": "Error parsing conversation analysis"
+                }
+            ]
+        }
+
+async def analyze_daily_conversations(user_conversations):
+    try:
+        # Read existing memories from the shared cache
+        existing_memories = list(memory_store.get_memories())
+        existing_memories_json = compact_json(pack_items(existing_memories, Config.MEMORY_PROMPT_BUDGET))
+        
+        # Format conversations for analysis, split into token-bounded chunks in map-reduce mode
+        if Config.NIGHTLY_MAP_REDUCE:
+            chunks = chunk_conversations(user_conversations, Config.NIGHTLY_CHUNK_TOKENS)
+        else:
+            chunks = [format_conversations(user_conversations)]
+        chunks = [chunk for chunk in chunks if chunk]
+        if not chunks:
+            logger.info("No conversations to analyze")
+            return {"topics": []}
+        
+        # Map: analyze chunks concurrently, bounded by the API concurrency limit
+        semaphore = asyncio.Semaphore(Config.NIGHTLY_CONCURRENCY)
         
-        # Log the raw response for debugging
-        response_content = response.choices[0].message.content
-        logger.info(f"Raw API Response: {response_content}")
+        async def analyze(chunk):
+            async with semaphore:
+                return await analyze_conversation_chunk(chunk, existing_memories_json)
         
-        # Try to clean the response if needed
-        cleaned_content = response_content.strip()
-        if cleaned_content.startswith("```json"):
-            cleaned_content = cleaned_content[7:]
-        if cleaned_content.endswith("```"):
-            cleaned_content = cleaned_content[:-3]
-        cleaned_content = cleaned_content.strip()
+        logger.info(f"Analyzing {len(chunks)} conversation chunks")
+        results = await asyncio.gather(*(analyze(chunk) for chunk in chunks), return_exceptions=True)
         
-        # Parse response with better error handling
-        try:
-            analysis = json.loads(cleaned_content)
-        except json.JSONDecodeError as json_err:
-            logger.error(f"JSON Parse Error: {json_err}")
-            logger.error(f"Attempted to parse: {cleaned_content}")
-            # Provide a fallback analysis if parsing fails
-            analysis = {
-                "topics": [
-                    {
-                        "topic": "conversation_parse_error",
-                        "summary": "had twouble understanding the convewsation today... maybe twy again tomowwow?",
-                        "exists": False,
-                        "relevant": False,
-                        "reasoning": "Error parsing conversation analysis"
-                    }
-                ]
-            }
+        analyses = []
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error analyzing conversation chunk: {result}")
+            else:
+                analyses.append(result)
+        if not analyses:
+            raise results[0]
+        
+        # Reduce: merge and deduplicate topics before a single write
+        analysis = {"topics": merge_topics(analyses)}
         
         # Update memories with new relevant topics
         await update_memories(analysis['topics'])
@@ -119,23 +140,69 @@ async def analyze_daily_conversations(user_conversations):
         logger.error(f"Error in analyze_daily_conversations: {e}")
         raise e
 
+def format_message(msg):
+    return f"{'Assistant' if msg['is_bot'] else 'User'}: {msg['content']}"
+
 def format_conversations(user_conversations):
     """Format the day's conversations into a readable string"""
     formatted = []
     for user_id, messages in user_conversations.items():
-        conversation = [
-            f"{'Assistant' if msg['is_bot'] else 'User'}: {msg['content']}"
-            for msg in messages
-        ]
+        conversation = [format_message(msg) for msg in messages]
         formatted.extend(conversation)
     return "\n".join(formatted)
 
+def chunk_conversations(user_conversations, max_tokens):
+    """
+    Format the day's conversations into chunks of at most max_tokens tokens.
+    Chunks break between users where possible, and between messages otherwise.
+    """
+    chunks = []
+    lines = []
+    used = 0
+    for user_id, messages in user_conversations.items():
+        conversation = [format_message(msg) for msg in messages]
+        cost = sum(count_tokens(line) + 1 for line in conversation)
+        # Start a new chunk rather than splitting a user's conversation that would fit on its own
+        if lines and used + cost > max_tokens and cost <= max_tokens:
+            chunks.append("\n".join(lines))
+            lines, used = [], 0
+        for line in conversation:
+            line = truncate_to_tokens(line, max_tokens - 1)
+            line_cost = count_tokens(line) + 1
+            if lines and used + line_cost > max_tokens:
+                chunks.append("\n".join(lines))
+                lines, used = [], 0
+            lines.append(line)
+            used += line_cost
+    if lines:
+        chunks.append("\n".join(lines))
+    return chunks
+
+def merge_topics(analyses):
+    """
+    Merge topics from several chunk analyses. Only entries with the same
+    summary once case, punctuation and fwog spelling are normalized are
+    reconciled into one; fuzzier folding against stored memories is left
+    to update_memories.
+    """
+    merged = {}
+    for analysis in analyses:
+        for topic in analysis.get('topics', []):
+            key = " ".join(fwog_spelling(word) for word in normalize(str(topic.get('summary', ''))).split())
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = topic
+                continue
+            logger.info(f"Duplicate topic summary across chunks: {topic.get('summary')}")
+            if topic.get('exists'):
+                # Any chunk that recognised this summary as known wins
+                existing['exists'] = True
+            elif topic.get('relevant') and not existing.get('relevant'):
+                merged[key] = dict(topic, exists=existing.get('exists', False))
+    return list(merged.values())
+
 async def update_memories(analyzed_topics):
     try:
-        # Read current memories
-        with open('memories.json', 'r') as f:
-            memory_data = json.load(f)
-        
         # Filter new and relevant topics
         new_memories = [
             topic['summary']
@@ -143,14 +210,20 @@ async def update_memories(analyzed_topics):
             if not topic['exists'] and topic['relevant']
         ]
         
-        # Add new memories
-        memory_data['memories'].extend(new_memories)
+        # Add new memories, skipping near-duplicates, and write them back from a worker thread
+        counts = {}
+        
+        def merge(memories):
+            merged_memories, counts['added'], counts['rejected'] = merge_memories(
+                memories, new_memories, Config.MEMORY_DEDUP_THRESHOLD
+            )
+            return merged_memories
         
-        # Write updated memories back to file
-        with open('memories.json', 'w') as f:
-            json.dump(memory_data, f, indent=4)
+        await asyncio.to_thread(memory_store.update, merge)
             
-        logger.info(f"Added {len(new_memories)} new memories")
+        logger.info(
+            f"Added {counts['added']} new memories ({counts['rejected']} rejected as near-duplicates)"
+        )
         
     except Exception as e:
         logger.error(f"Error in update_memories: {e}")
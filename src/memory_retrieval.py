@@ -0,0 +1,92 @@
+import math
+import re
+import logging
+from collections import Counter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('memory_retrieval')
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9$]+")
+
+# Words too common to say anything about which memory is relevant
+STOPWORDS = frozenset("""
+a an and are as at be but by can do for from has have hi hey how i im is it its
+just me my of on or so that the this to u ur was we what when wen who why will
+with you your
+""".split())
+
+def tokenize(text):
+    """Lowercase text and split it into word tokens"""
+    tokens = [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+    # Fwog writes 'w' for 'r' and 'l', so index both spellings of each word
+    return tokens + [t.replace('r', 'w').replace('l', 'w') for t in tokens if 'r' in t or 'l' in t]
+
+class BM25Index:
+    """Okapi BM25 index over a list of memory strings, fully in-process"""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.documents = list(documents)
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(doc)) for doc in self.documents]
+        self.doc_lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.documents else 0.0
+
+        doc_freqs = Counter()
+        for tf in self.term_freqs:
+            doc_freqs.update(tf.keys())
+        total = len(self.documents)
+        self.idf = {
+            term: math.log(1 + (total - freq + 0.5) / (freq + 0.5))
+            for term, freq in doc_freqs.items()
+        }
+
+    def scores(self, query):
+        """Score every document against the query"""
+        query_terms = set(tokenize(query))
+        results = []
+        for tf, length in zip(self.term_freqs, self.doc_lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            for term in query_terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            results.append(score)
+        return results
+
+    def top_k(self, query, k=3, min_score=0.0):
+        """Return up to k documents scoring above min_score, best first"""
+        scored = [
+            (score, index)
+            for index, score in enumerate(self.scores(query))
+            if score > min_score
+        ]
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [self.documents[index] for _, index in scored[:k]]
+
+_index = None
+_index_key = None
+
+def get_index(memories, version=None):
+    """
+    Return a BM25 index for the memories, rebuilding it only when they change.
+    When the memory store version is given it is used as the cache key.
+    """
+    global _index, _index_key
+    memories = tuple(memories)
+    key = ('version', version) if version is not None else ('memories', memories)
+    if _index is None or key != _index_key:
+        _index = BM25Index(memories)
+        _index_key = key
+        logger.info(f"Built memory index over {len(memories)} memories")
+    return _index
+
+def retrieve_memories(memories, user_message, k=3, version=None):
+    """
+    Select the memories most relevant to the message without any network call.
+    Returns a comma-separated string of relevant memories.
+    """
+    index = get_index(memories, version)
+    return ", ".join(index.top_k(user_message, k=k))
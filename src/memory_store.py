@@ -0,0 +1,102 @@
+import json
+import os
+import time
+import logging
+import threading
+from config import Config
+from persistence import atomic_write_json
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('memory_store')
+
+MEMORIES_PATH = 'memories.json'
+
+class MemoryStore:
+    """
+    Process-wide cache of memories.json.
+    The file is read once and re-read only when its mtime changes. Every change
+    bumps a monotonic version that downstream caches can key on.
+    """
+
+    def __init__(self, path=MEMORIES_PATH, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        # (version, memories tuple, file data, mtime), replaced as a whole so readers need no lock
+        self._state = None
+        self._version = 0
+        self._last_check = 0.0
+
+    def get_memories(self):
+        """Return the current memories as an immutable tuple"""
+        self._refresh()
+        return self._state[1]
+
+    def snapshot(self):
+        """Return (version, memories) read consistently"""
+        self._refresh()
+        version, memories, _, _ = self._state
+        return version, memories
+
+    def update(self, func, attempts=3):
+        """
+        Replace the memory list with func(current list) and persist it.
+        func runs without the lock; the result is only written if the memories
+        did not change meanwhile, otherwise func is run again on the new list.
+        """
+        for _ in range(attempts):
+            with self._lock:
+                self._load_if_stale(force_stat=True)
+                version, memories, data, _ = self._state
+            new_memories = list(func(list(memories)))
+            with self._lock:
+                self._load_if_stale(force_stat=True)
+                if self._state[0] != version:
+                    continue
+                self._write(dict(data, memories=new_memories))
+                return self._state[1]
+        raise RuntimeError(f"Memories kept changing during {attempts} update attempts")
+
+    def _refresh(self):
+        # Serve from memory between mtime checks so the hot path stays off disk
+        if self._state is not None and time.monotonic() - self._last_check < self.check_interval:
+            return
+        # Never wait behind a writer on the event loop; the current snapshot is still valid
+        if not self._lock.acquire(blocking=self._state is None):
+            return
+        try:
+            self._load_if_stale()
+        finally:
+            self._lock.release()
+
+    def _load_if_stale(self, force_stat=False):
+        now = time.monotonic()
+        if self._state is not None and not force_stat and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            if self._state is None:
+                logger.error(f"Memories file not found at {self.path}")
+                self._set_data({'memories': []}, None)
+            return
+        if self._state is not None and mtime == self._state[3]:
+            return
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        data.setdefault('memories', [])
+        self._set_data(data, mtime)
+        logger.info(f"Loaded {len(data['memories'])} memories (version {self._version})")
+
+    def _write(self, data):
+        atomic_write_json(self.path, data, indent=4)
+        self._set_data(data, os.stat(self.path).st_mtime_ns)
+
+    def _set_data(self, data, mtime):
+        self._version += 1
+        self._state = (self._version, tuple(data['memories']), data, mtime)
+
+# Shared instance used by the bot and the nightly processor
+memory_store = MemoryStore(check_interval=Config.MEMORY_STORE_CHECK_INTERVAL)
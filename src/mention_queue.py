@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from structured_logging import log_event
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('mention_queue')
+
+class MentionQueue:
+    """
+    Bounded work queue for mention handling.
+    A fixed number of workers caps in-flight completions; submissions beyond
+    max_depth are rejected so the caller can shed load cheaply.
+    """
+
+    def __init__(self, handler, workers=4, max_depth=50):
+        self.handler = handler
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=max_depth)
+        self._tasks = []
+
+    @property
+    def started(self):
+        return bool(self._tasks)
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    def start(self):
+        """Start the worker tasks on the running loop"""
+        if self.started:
+            return
+        self._tasks = [
+            asyncio.create_task(self._worker(index))
+            for index in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} mention workers (max queue depth {self.queue.maxsize})")
+
+    def submit(self, message):
+        """Queue a message for handling; returns False when the queue is full"""
+        try:
+            self.queue.put_nowait((message, asyncio.get_running_loop().time()))
+            return True
+        except asyncio.QueueFull:
+            log_event(logger, 'mention_shed', logging.WARNING, queue_depth=self.queue.maxsize)
+            return False
+
+    async def stop(self):
+        """Cancel the workers"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, index):
+        loop = asyncio.get_running_loop()
+        while True:
+            message, enqueued_at = await self.queue.get()
+            try:
+                await self.handler(message, loop.time() - enqueued_at)
+            except Exception as e:
+                logger.error(f"Mention worker {index} failed: {e}")
+            finally:
+                self.queue.task_done()
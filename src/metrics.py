@@ -0,0 +1,201 @@
+import time
+import logging
+import threading
+from contextlib import asynccontextmanager
+from aiohttp import web
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('metrics')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+_registry = []
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+class Gauge(Metric):
+    """Value that can go up and down, or be read from a callback at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+    def set_function(self, function, **labels):
+        self._functions[self._key(labels)] = function
+
+    def render(self):
+        for key, function in list(self._functions.items()):
+            try:
+                value = function()
+                with _lock:
+                    self._values[key] = value
+            except Exception as e:
+                logger.error(f"Error reading gauge {self.name}: {e}")
+        return super().render()
+
+class Histogram(Metric):
+    """Cumulative bucketed observations with sum and count"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][index] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def percentile(self, quantile, **labels):
+        """Estimate a quantile from the bucket counts (upper bound of the matching bucket)"""
+        state = self._values.get(self._key(labels))
+        if not state or not state['count']:
+            return None
+        target = quantile * state['count']
+        seen = 0
+        for bound, count in zip(self.buckets, state['buckets']):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.buckets[-1]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            items = sorted((key, {
+                'buckets': list(state['buckets']), 'sum': state['sum'], 'count': state['count']
+            }) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['buckets']):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+def render():
+    """Render every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+# Pipeline metrics
+STAGE_SECONDS = Histogram('fwog_stage_duration_seconds', 'Duration of bot pipeline stages', ['stage'])
+STAGE_ERRORS = Counter('fwog_stage_errors_total', 'Failed or timed out pipeline stages', ['stage'])
+LLM_SECONDS = Histogram('fwog_llm_request_duration_seconds', 'Duration of LLM completion calls', ['task'])
+LLM_TOKENS = Counter('fwog_llm_tokens_total', 'Tokens reported by the LLM API', ['task', 'kind'])
+LLM_ROUTE = Counter('fwog_llm_route_total', 'LLM completion calls by task and model tier', ['task', 'tier'])
+LLM_HEDGES = Counter('fwog_llm_hedges_total', 'Hedged completion calls by outcome', ['task', 'outcome'])
+BREAKER_STATE = Gauge('fwog_llm_circuit_state', 'LLM circuit breaker state (0 closed, 1 half-open, 2 open)', ['circuit'])
+LLM_ERRORS = Counter('fwog_llm_errors_total', 'Failed LLM completion calls', ['task'])
+QUEUE_DEPTH = Gauge('fwog_mention_queue_depth', 'Mentions waiting for a worker')
+QUEUE_WAIT_SECONDS = Histogram('fwog_mention_queue_wait_seconds', 'Time mentions spend queued')
+MENTIONS = Counter('fwog_mentions_total', 'Handled mentions by outcome', ['outcome'])
+PROMPT_PREFIX = Counter('fwog_reply_prompt_prefix_total', 'Reply prompt static prefixes by reused or changed', ['result'])
+PROMPT_PREFIX_TOKENS = Gauge('fwog_reply_prompt_prefix_tokens', 'Estimated tokens in the current static reply prefix')
+MEMORY_CACHE = Gauge('fwog_memory_selection_cache', 'Memory selection cache counters', ['stat'])
+
+@asynccontextmanager
+async def time_stage(stage):
+    """Record the duration of a stage, and count it as an error if it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+def record_usage(task, response):
+    """Count prompt/completion tokens from a completion response, if it reports usage"""
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, 'prompt_tokens', 0) or 0, task=task, kind='prompt')
+    LLM_TOKENS.inc(getattr(usage, 'completion_tokens', 0) or 0, task=task, kind='completion')
+    # Prompt tokens served from the provider's prefix cache, when the backend reports them
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached = details.get('cached_tokens') if isinstance(details, dict) else getattr(details, 'cached_tokens', None)
+    if cached:
+        LLM_TOKENS.inc(cached, task=task, kind='cached_prompt')
+
+async def handle_metrics(request):
+    return web.Response(text=render(), content_type='text/plain', charset='utf-8')
+
+async def start_metrics_server(host='127.0.0.1', port=9108):
+    """Serve /metrics over aiohttp on the running loop; returns the runner"""
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
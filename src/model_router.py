@@ -0,0 +1,79 @@
+import json
+import time
+import logging
+from config import Config
+from metrics import LLM_ROUTE
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('model_router')
+
+ROUTE_FIELDS = ('model', 'base_url', 'max_tokens', 'timeout', 'latency_budget')
+
+class ModelRouter:
+    """
+    Maps each task to a model, endpoint, max_tokens and timeout.
+    A route with a latency_budget and a fallback tracks its primary's latency;
+    once the moving average exceeds the budget (or the primary fails) the task
+    uses the fallback for the cooldown, then the primary is tried again.
+    A null model or base_url means Config.AI_MODEL / Config.LLM_API_BASE.
+    """
+
+    def __init__(self, routes, cooldown=300.0, smoothing=0.3):
+        self.routes = routes
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self._latency = {}
+        self._degraded_until = {}
+
+    @classmethod
+    def load(cls, path, cooldown=300.0):
+        try:
+            with open(path, 'r') as f:
+                routes = json.load(f)['routes']
+        except FileNotFoundError:
+            logger.error(f"Model routes file not found at {path}, using defaults for every task")
+            routes = {}
+        return cls(routes, cooldown)
+
+    def _settings(self, route):
+        settings = {field: route.get(field) for field in ROUTE_FIELDS}
+        settings['model'] = settings['model'] or Config.AI_MODEL
+        settings['base_url'] = settings['base_url'] or Config.LLM_API_BASE
+        return settings
+
+    def resolve(self, task):
+        """Return (tier, settings) for a task, tier being 'primary' or 'fallback'"""
+        route = self.routes.get(task, self.routes.get('default', {}))
+        fallback = route.get('fallback')
+        if fallback is not None and time.monotonic() < self._degraded_until.get(task, 0):
+            return 'fallback', self._settings({**route, **fallback})
+        return 'primary', self._settings(route)
+
+    def observe(self, task, tier, seconds, failed=False):
+        """Record a call's outcome and switch the task to its fallback if the primary is too slow"""
+        LLM_ROUTE.inc(task=task, tier=tier)
+        route = self.routes.get(task, {})
+        budget = route.get('latency_budget')
+        if tier != 'primary' or budget is None or route.get('fallback') is None:
+            return
+        previous = self._latency.get(task)
+        latency = seconds if previous is None else previous + self.smoothing * (seconds - previous)
+        self._latency[task] = latency
+        if failed or latency > budget:
+            self._degraded_until[task] = time.monotonic() + self.cooldown
+            # Start the next probe of the primary from a clean slate
+            self._latency.pop(task, None)
+            logger.warning(
+                f"{task} primary model {'failed' if failed else f'averaging {latency:.1f}s'} "
+                f"(budget {budget}s), using the fallback for {self.cooldown:.0f}s"
+            )
+
+_router = None
+
+def get_router():
+    """Return the router built from MODEL_ROUTES_PATH, loading it on first use"""
+    global _router
+    if _router is None:
+        _router = ModelRouter.load(Config.MODEL_ROUTES_PATH, Config.MODEL_FALLBACK_COOLDOWN)
+    return _router
@@ -0,0 +1,104 @@
+import os
+import json
+import asyncio
+import logging
+import tempfile
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('persistence')
+
+def atomic_write_text(path, text):
+    """Write text to path via a fsynced temp file and rename, so readers never see a torn file"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        # Keep the permissions of the file being replaced
+        try:
+            os.fchmod(fd, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.fchmod(fd, 0o644)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    try:
+        # Persist the rename itself
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+
+def atomic_write_json(path, data, indent=2):
+    """Serialize data and write it atomically"""
+    atomic_write_text(path, json.dumps(data, indent=indent))
+
+class WriteBehindWriter:
+    """
+    Coalescing write-behind persistence for JSON files.
+    schedule() returns immediately; the latest data per path is written by a
+    worker thread after a short delay, so bursts of updates become one write.
+    """
+
+    def __init__(self, delay=0.5):
+        self.delay = delay
+        self._pending = {}
+        self._in_flight = {}
+        self._task = None
+        self._lock = None
+
+    def schedule(self, path, data, indent=2):
+        """Queue data to be written to path, replacing any pending write for it"""
+        # Serialize now so later mutations of data cannot leak into the write
+        self._pending[path] = json.dumps(data, indent=indent)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    def pending(self, path):
+        """Return the not-yet-written data for path, or None"""
+        text = self._pending.get(path, self._in_flight.get(path))
+        return json.loads(text) if text is not None else None
+
+    async def flush(self):
+        """Write every pending update now"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while self._pending:
+                batch, self._pending = self._pending, {}
+                self._in_flight = batch
+                try:
+                    await asyncio.to_thread(self._write_batch, batch)
+                except Exception as e:
+                    logger.error(f"Error in write-behind flush: {e}")
+                    # Retry later unless a newer update already replaced it
+                    for path, text in batch.items():
+                        self._pending.setdefault(path, text)
+                    raise
+                finally:
+                    self._in_flight = {}
+
+    def _write_batch(self, batch):
+        for path, text in batch.items():
+            atomic_write_text(path, text)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delay)
+        try:
+            await self.flush()
+        except Exception:
+            # Already logged; the next schedule() will try again
+            pass
+
+# Shared writer for the narrative files
+writer = WriteBehindWriter()
@@ -0,0 +1,100 @@
+import re
+import json
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('prompt_budget')
+
+# Words and single punctuation marks, a close local stand-in for BPE token counts
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+ELLIPSIS = "..."
+
+def count_tokens(text):
+    """Approximate the number of model tokens in text without a tokenizer"""
+    if not text:
+        return 0
+    # Long words split into several BPE pieces, roughly one per 6 characters
+    return sum(1 + len(piece) // 6 for piece in TOKEN_PATTERN.findall(text))
+
+def compact_json(obj):
+    """Serialize obj without indentation or padding"""
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+def truncate_to_tokens(text, budget, keep='start'):
+    """
+    Cut text down to roughly budget tokens on whitespace boundaries.
+    keep='start' keeps the beginning, keep='end' keeps the most recent text.
+    """
+    if count_tokens(text) <= budget:
+        return text
+    if budget <= 0:
+        return ''
+    words = text.split(' ')
+    if keep == 'end':
+        words.reverse()
+    kept = []
+    used = count_tokens(ELLIPSIS)
+    for word in words:
+        cost = count_tokens(word)
+        if used + cost > budget:
+            break
+        kept.append(word)
+        used += cost
+    if keep == 'end':
+        kept.reverse()
+        return ELLIPSIS + ' '.join(kept)
+    return ' '.join(kept) + ELLIPSIS
+
+def pack_items(items, budget, newest_first=True):
+    """
+    Keep as many whole items as fit in budget tokens when serialized compactly.
+    Items are assumed to be oldest first; with newest_first the latest are kept.
+    Returns the kept items in their original order.
+    """
+    ordered = list(reversed(items)) if newest_first else list(items)
+    kept = []
+    used = 2  # brackets
+    for item in ordered:
+        cost = count_tokens(compact_json(item)) + 1
+        if used + cost > budget:
+            break
+        kept.append(item)
+        used += cost
+    if len(kept) < len(items):
+        logger.debug("Packed %d of %d items into %d tokens", len(kept), len(items), budget)
+    return list(reversed(kept)) if newest_first else kept
+
+class PromptSection:
+    """One named piece of a prompt with a packing priority (lower packs first)"""
+
+    def __init__(self, name, text, priority, keep='start', min_tokens=8):
+        self.name = name
+        self.text = text or ''
+        self.priority = priority
+        self.keep = keep
+        self.min_tokens = min_tokens
+
+def assemble_sections(sections, budget):
+    """
+    Fit sections into budget tokens by priority.
+    Higher-priority sections are kept whole when possible; the first section that
+    does not fit is truncated, and any that cannot keep min_tokens are dropped.
+    Returns a dict of section name to the text that made it in.
+    """
+    remaining = budget
+    packed = {}
+    for section in sorted(sections, key=lambda s: s.priority):
+        cost = count_tokens(section.text)
+        if cost <= remaining:
+            packed[section.name] = section.text
+            remaining -= cost
+        elif remaining >= section.min_tokens:
+            packed[section.name] = truncate_to_tokens(section.text, remaining, keep=section.keep)
+            remaining -= count_tokens(packed[section.name])
+            logger.debug("Truncated prompt section %s from %d tokens", section.name, cost)
+        else:
+            packed[section.name] = ''
+            if cost:
+                logger.debug("Dropped prompt section %s (%d tokens)", section.name, cost)
+    return packed
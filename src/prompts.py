@@ -73,3 +73,27 @@ END_ORTHO_BACK_STYLE
 TOPICS = [
     "not used in conversation bots"
 ]
+
+# Cheap in-character replies used when too many mentions are already queued
+BUSY_REPLIES = [
+    "too many fwiends tawking at once... my wittle head is spinning x_x twy again in a bit?",
+    "howd on howd on... fwog is wistening to evewyone wight now, ask me again soon :o",
+    "*ribbit* so many voices!! gimme a sec to catch my bweath",
+    "uh oh... the pond is weawwy busy wight now, come back in a wittle bit?"
+]
+
+# Last-resort in-character replies when the model is unreachable and no pool is ready yet
+OUTAGE_REPLIES = [
+    "bwb... my bwain is a wittle foggy wight now, the pond went aww quiet o_o",
+    "*ribbit*... sowwy fwiend, i zoned out watching a fwy. say that again watew?",
+    "hmm my thoughts got stuck in the mud fow a sec... give me a wittle bit :o",
+    "the wiwy pad wifi is acting up again... fwog wiww be back soon!!"
+]
+
+# Pre-generates standalone replies served while the model is unreachable
+FALLBACK_REPLIES_PROMPT = """Write {count} short, different replies Fwog could send to almost any message from a friend, without knowing what the message said.
+Let this emotion shape every reply: {format}.
+What is happening in Fwog's story right now, to hint at if it fits: {event}
+Write like a text message using text-speak, replacing 'r' with 'fw' and 'l' with 'w'. Do not use emojis. Do not mention any username.
+Return ONLY a JSON object in this exact format, with no additional text, comments, backticks, or other formatting:
+{{"replies": ["first reply", "second reply"]}}"""
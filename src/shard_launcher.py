@@ -0,0 +1,77 @@
+"""
+Run the bot as several processes, each owning a slice of the gateway shards.
+
+Every process gets SHARD_COUNT and its own SHARD_IDS, and all of them share the
+state backend (SQLite in WAL mode unless STATE_BACKEND names another shared store).
+Exactly one process holds the leader lease and runs the narrative and nightly jobs.
+
+Run from the repository root:
+    python src/shard_launcher.py --processes 2 --shards 4
+"""
+import os
+import sys
+import signal
+import logging
+import argparse
+import subprocess
+from config import Config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('shard_launcher')
+
+def assign_shards(shard_count, processes):
+    """Split shard ids 0..shard_count-1 round-robin across processes"""
+    return [list(range(index, shard_count, processes)) for index in range(processes)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the bot across several sharded processes")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--shards', type=int, default=None, help="total shards (default: one per process)")
+    args = parser.parse_args(argv)
+
+    shard_count = args.shards or max(Config.SHARD_COUNT, args.processes)
+    processes = min(args.processes, shard_count)
+    backend = Config.STATE_BACKEND
+    if backend == 'memory' and processes > 1:
+        # In-process state would not be shared between the workers
+        logger.warning("STATE_BACKEND=memory cannot be shared between processes, using sqlite")
+        backend = 'sqlite'
+
+    children = []
+    for index, shard_ids in enumerate(assign_shards(shard_count, processes)):
+        env = dict(
+            os.environ,
+            SHARD_COUNT=str(shard_count),
+            SHARD_IDS=','.join(map(str, shard_ids)),
+            STATE_BACKEND=backend,
+            # Each worker serves its own /metrics: base port + worker index (0 stays disabled)
+            METRICS_PORT=str(Config.METRICS_PORT + index if Config.METRICS_PORT else 0)
+        )
+        children.append(subprocess.Popen([sys.executable, os.path.join('src', 'bot.py')], env=env))
+        logger.info(f"Started process {children[-1].pid} for shards {shard_ids} of {shard_count}")
+
+    def stop(signum, frame):
+        for child in children:
+            if child.poll() is None:
+                child.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # If any worker exits, stop the rest so the deployment restarts as a whole
+    exit_code = 0
+    while children:
+        pid, status = os.wait()
+        exited = [child for child in children if child.pid == pid]
+        if not exited:
+            continue
+        children.remove(exited[0])
+        code = os.waitstatus_to_exitcode(status)
+        logger.info(f"Process {pid} exited with {code}")
+        exit_code = exit_code or code
+        stop(None, None)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import importlib
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from config import Config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('state_backend')
+
+class StateBackend(ABC):
+    """
+    Key-value state shared by the bot processes.
+    Values are JSON-serializable and grouped by namespace. Leases give one
+    owner at a time exclusive use of a name until they expire.
+    Set blocking = True when methods do I/O, so callers run them in a thread.
+    """
+    blocking = False
+
+    @abstractmethod
+    def get(self, namespace, key, default=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, namespace, key, value):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, namespace, key):
+        raise NotImplementedError
+
+    @abstractmethod
+    def push(self, namespace, key, item, maxlen):
+        """Append item to the list stored at key, keeping only the last maxlen items"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def acquire_lease(self, name, owner, ttl):
+        """Take or renew the lease on name for ttl seconds; returns True if owner holds it"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def release_lease(self, name, owner):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    async def call(self, method, *args):
+        """Run a backend method without blocking the event loop"""
+        function = getattr(self, method)
+        if self.blocking:
+            return await asyncio.to_thread(function, *args)
+        return function(*args)
+
+class MemoryBackend(StateBackend):
+    """In-process stand-in for a key-value store; the single-process default"""
+
+    def __init__(self):
+        self._data = {}
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            value = self._data.get((namespace, str(key)), default)
+            return list(value) if isinstance(value, deque) else value
+
+    def set(self, namespace, key, value):
+        with self._lock:
+            self._data[(namespace, str(key))] = value
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, str(key)), None)
+
+    def push(self, namespace, key, item, maxlen):
+        with self._lock:
+            items = self._data.get((namespace, str(key)))
+            if items is None:
+                items = self._data[(namespace, str(key))] = deque(maxlen=maxlen)
+            items.append(item)
+            return list(items)
+
+    def acquire_lease(self, name, owner, ttl):
+        now = time.time()
+        with self._lock:
+            holder = self._leases.get(name)
+            if holder is None or holder[0] == owner or holder[1] <= now:
+                self._leases[name] = (owner, now + ttl)
+                return True
+            return False
+
+    def release_lease(self, name, owner):
+        with self._lock:
+            if self._leases.get(name, (None,))[0] == owner:
+                del self._leases[name]
+
+class SQLiteBackend(StateBackend):
+    """
+    SQLite in WAL mode, shared by processes on one host.
+    Each thread gets its own connection; readers never block the single writer.
+    """
+    blocking = True
+
+    def __init__(self, path='src/db/state.sqlite3', busy_timeout=5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "updated REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key, default=None):
+        row = self._connect().execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, str(key))
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, namespace, key, value):
+        self._connect().execute(
+            "INSERT INTO kv (namespace, key, value, updated) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, updated = excluded.updated",
+            (namespace, str(key), json.dumps(value, ensure_ascii=False), time.time())
+        )
+
+    def delete(self, namespace, key):
+        self._connect().execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, str(key)))
+
+    def push(self, namespace, key, item, maxlen):
+        conn = self._connect()
+        # Read-modify-write under the write lock so concurrent pushes are not lost
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            items = self.get(namespace, key, [])
+            items = (items + [item])[-maxlen:]
+            self.set(namespace, key, items)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return items
+
+    def acquire_lease(self, name, owner, ttl):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT owner, expires FROM leases WHERE name = ?", (name,)).fetchone()
+            acquired = row is None or row[0] == owner or row[1] <= now
+            if acquired:
+                conn.execute(
+                    "INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires",
+                    (name, owner, now + ttl)
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return acquired
+
+    def release_lease(self, name, owner):
+        self._connect().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+def create_backend(kind=None, path=None):
+    """
+    Build the backend named by STATE_BACKEND: 'memory', 'sqlite', or
+    'package.module:ClassName' for a custom StateBackend (constructed without arguments).
+    """
+    kind = kind or Config.STATE_BACKEND
+    if kind == 'memory':
+        return MemoryBackend()
+    if kind == 'sqlite':
+        return SQLiteBackend(path or Config.STATE_BACKEND_PATH)
+    module_name, _, class_name = kind.partition(':')
+    if not class_name:
+        raise ValueError(f"Unknown state backend {kind!r}")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+class ConversationHistory:
+    """Last few messages per user, kept in the shared backend so every shard sees them"""
+
+    def __init__(self, backend, maxlen):
+        self.backend = backend
+        self.maxlen = maxlen
+
+    async def append(self, user_id, content, is_bot):
+        item = {'content': content, 'is_bot': is_bot, 'timestamp': time.time()}
+        await self.backend.call('push', 'conversations', user_id, item, self.maxlen)
+
+    async def get(self, user_id):
+        return await self.backend.call('get', 'conversations', user_id, [])
+
+class LeaderLease:
+    """
+    Lease-based leadership: the holder renews well before ttl expires, and a
+    crashed leader's lease lapses so another process takes over.
+    """
+
+    def __init__(self, backend, name, owner, ttl=30.0):
+        self.backend = backend
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.is_leader = False
+
+    async def renew(self):
+        try:
+            leader = await self.backend.call('acquire_lease', self.name, self.owner, self.ttl)
+        except Exception as e:
+            logger.error(f"Error renewing {self.name} lease: {e}")
+            leader = False
+        if leader != self.is_leader:
+            logger.info(f"{self.owner} {'acquired' if leader else 'lost'} the {self.name} lease")
+        self.is_leader = leader
+        return leader
+
+    async def release(self):
+        if self.is_leader:
+            self.is_leader = False
+            await self.backend.call('release_lease', self.name, self.owner)
@@ -1,25 +1,34 @@
+import copy
 import json
-from openai import OpenAI
+import hashlib
 import asyncio
 from datetime import datetime
+from types import MappingProxyType
 import logging
 from config import Config
+from structured_output import complete_json
 from creativity_manager import generate_creative_instructions
+from persistence import writer
+from prompt_budget import compact_json, count_tokens, pack_items
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('story_circle_manager')
 
-# Initialize OpenAI client
-client = OpenAI(
-    api_key=Config.OPENAI_API_KEY,
-    base_url="https://glhf.chat/api/openai/v1"
-)
-
 # File paths
 STORY_CIRCLE_PATH = 'src/db/story_circle.json'
 CIRCLES_MEMORY_PATH = 'src/db/circles_memory.json'
 
+# Immutable snapshot of the current event and inner dialogue served to the reply path
+EMPTY_CONTEXT = MappingProxyType({
+    'current_event': '',
+    'current_inner_dialogue': ''
+})
+_current_context = None
+
+# Background pre-generation of the next phase: {'fingerprint': ..., 'task': asyncio.Task}
+_lookahead = None
+
 # System prompt for story circle updates
 STORY_CIRCLE_PROMPT = '''You are a master storyteller and world-builder for an AI chatbot. Your task is to develop and maintain an ongoing narrative for a character named "**Fwog-ai**" using Dan Harmon's Story Circle framework.
 
@@ -161,8 +170,47 @@ Previous memories for context:
 Remember: Return ONLY the JSON object, no additional text, comments, or formatting.
 '''
 
+EPOCH_SUMMARY_PROMPT = '''You are a narrative summarizer for story circles. Your task is to fold several summaries of Fwog's past story circles into a single concise paragraph.
+
+Keep the key characters, places, discoveries and lessons so that future story circles can build on them without repeating them.
+
+IMPORTANT: You must return ONLY a valid JSON object matching EXACTLY this structure:
+
+JSON_TEMPLATE
+{{
+  "summary": "string"
+}}
+END_JSON_TEMPLATE
+
+Summaries to fold, oldest first:
+{summaries}
+
+Remember: Return ONLY the JSON object, no additional text, comments, or formatting.
+'''
+
+# Shapes the narrative calls must return before their output is used
+STORY_CIRCLE_SCHEMA = {
+    "narrative": {
+        "current_story_circle": [{"phase": str, "description": str}],
+        "current_phase": str,
+        "events": [str],
+        "inner_dialogues": [str],
+        "dynamic_context": {
+            "current_event": str,
+            "current_inner_dialogue": str,
+            "next_event": str
+        }
+    }
+}
+SUMMARY_SCHEMA = {"memories": [str]}
+EPOCH_SUMMARY_SCHEMA = {"summary": str}
+
 async def load_story_circle():
     """Load the current story circle from JSON"""
+    # A scheduled but unwritten update is newer than the file
+    pending = writer.pending(STORY_CIRCLE_PATH)
+    if pending is not None:
+        return pending
     try:
         with open(STORY_CIRCLE_PATH, 'r') as f:
             return json.load(f)
@@ -173,37 +221,39 @@ async def load_story_circle():
 async def load_circles_memory():
     """Load the circles memory from JSON"""
     try:
-        with open(CIRCLES_MEMORY_PATH, 'r') as f:
-            data = json.load(f)
-            
-            # Debug print
-            logger.info(f"Loaded raw data: {json.dumps(data, indent=2)}")
+        # A scheduled but unwritten update is newer than the file
+        data = writer.pending(CIRCLES_MEMORY_PATH)
+        if data is None:
+            with open(CIRCLES_MEMORY_PATH, 'r') as f:
+                data = json.load(f)
+        
+        # Ensure correct structure
+        if "completed_circles" in data and "memories" not in data:
+            # Convert old format to new
+            data = {"memories": data["completed_circles"]}
+        elif "memories" not in data:
+            # Initialize with empty memories if neither exists
+            data = {"memories": []}
             
-            # Ensure correct structure
-            if "completed_circles" in data and "memories" not in data:
-                # Convert old format to new
-                data = {"memories": data["completed_circles"]}
-            elif "memories" not in data:
-                # Initialize with empty memories if neither exists
-                data = {"memories": []}
-                
-            logger.info(f"Returning structured data: {json.dumps(data, indent=2)}")
-            return data
+        logger.debug(
+            "Loaded circles memory (%d circles, %d epochs)",
+            len(data["memories"]), len(data.get("epochs", []))
+        )
+        return data
             
     except FileNotFoundError:
         logger.info("No existing memories file, creating new one")
         data = {"memories": []}
-        with open(CIRCLES_MEMORY_PATH, 'w') as f:
-            json.dump(data, f, indent=2)
+        writer.schedule(CIRCLES_MEMORY_PATH, data)
         return data
     except Exception as e:
         logger.error(f"Error loading circles memory: {e}")
         raise
 
 async def save_story_circle(story_circle):
-    """Save the updated story circle to JSON"""
-    with open(STORY_CIRCLE_PATH, 'w') as f:
-        json.dump(story_circle, f, indent=2)
+    """Save the updated story circle to JSON (atomic write-behind, off the event loop)"""
+    writer.schedule(STORY_CIRCLE_PATH, story_circle)
+    publish_context(story_circle)
 
 async def save_circles_memory(circles_memory):
     """Save the circles memory to JSON"""
@@ -218,28 +268,92 @@ async def save_circles_memory(circles_memory):
         elif "memories" not in circles_memory:
             circles_memory = {"memories": []}
             
-        logger.info(f"Saving circles memory: {json.dumps(circles_memory, indent=2)}")
+        logger.debug(
+            "Saving circles memory (%d circles, %d epochs)",
+            len(circles_memory["memories"]), len(circles_memory.get("epochs", []))
+        )
         
-        with open(CIRCLES_MEMORY_PATH, 'w') as f:
-            json.dump(circles_memory, f, indent=2)
+        writer.schedule(CIRCLES_MEMORY_PATH, circles_memory)
             
     except Exception as e:
         logger.error(f"Error saving circles memory: {e}")
         raise
 
+def circles_memory_for_prompt(circles_memory):
+    """
+    Bounded view of circles memory for prompts.
+    Recent circles are kept verbatim and older ones appear as epoch summaries;
+    both are packed newest-first into CIRCLES_PROMPT_BUDGET tokens.
+    """
+    budget = Config.CIRCLES_PROMPT_BUDGET
+    memories = pack_items(circles_memory.get("memories", []), budget)
+    view = {"memories": memories}
+    epochs = circles_memory.get("epochs", [])
+    if epochs:
+        used = count_tokens(compact_json(memories))
+        view = {"epochs": pack_items(epochs, max(budget - used, 0)), "memories": memories}
+    return view
+
+def require_summary_text(summary):
+    if not summary["summary"].strip():
+        raise ValueError("$.summary is empty")
+
+async def summarize_circles(summaries):
+    """Fold several circle summaries into one paragraph"""
+    summary = await complete_json(
+        messages=[
+            {"role": "system", "content": EPOCH_SUMMARY_PROMPT.format(summaries=compact_json(summaries))},
+            {
+                "role": "user",
+                "content": "Fold these summaries into a single paragraph and return it in the exact JSON format specified in your system prompt. Include only the JSON object, no other text, comments, backticks, or other formatting."
+            }
+        ],
+        schema=EPOCH_SUMMARY_SCHEMA,
+        task='summary',
+        validator=require_summary_text,
+        temperature=0.0
+    )
+    return summary["summary"]
+
+async def compact_circles_memory(circles_memory):
+    """
+    Fold older circles into epoch summaries, in place.
+    The newest CIRCLES_RECENT_LIMIT circles stay verbatim; once CIRCLES_FOLD_BATCH more
+    have piled up they become one epoch, and too many epochs are folded together.
+    Returns True if anything changed.
+    """
+    memories = circles_memory["memories"]
+    epochs = circles_memory.setdefault("epochs", [])
+    changed = False
+    
+    overflow = len(memories) - Config.CIRCLES_RECENT_LIMIT
+    if overflow >= Config.CIRCLES_FOLD_BATCH:
+        epochs.append(await summarize_circles(memories[:overflow]))
+        del memories[:overflow]
+        logger.info(f"Folded {overflow} circles into epoch summary {len(epochs)}")
+        changed = True
+    
+    if len(epochs) > Config.CIRCLES_EPOCH_LIMIT:
+        folded = len(epochs)
+        epochs[:] = [await summarize_circles(epochs)]
+        logger.info(f"Folded {folded} epoch summaries into one")
+        changed = True
+    
+    if not epochs:
+        del circles_memory["epochs"]
+    return changed
+
 async def generate_circle_summary(story_circle, circles_memory):
     """Generate a summary of a completed story circle"""
     try:
         # Format the prompt with current data
         formatted_prompt = SUMMARY_PROMPT.format(
             story_circle=json.dumps(story_circle, indent=2, ensure_ascii=False),
-            previous_summaries=json.dumps(circles_memory, indent=2, ensure_ascii=False)
+            previous_summaries=compact_json(circles_memory_for_prompt(circles_memory))
         )
         
-        # Get the summary from the AI using new SDK syntax
-        response = await asyncio.to_thread(
-            client.chat.completions.create,
-            model="hf:nvidia/Llama-3.1-Nemotron-70B-Instruct-HF",
+        # Get the summary from the AI, retrying with a repair hint if the JSON is unusable
+        summary = await complete_json(
             messages=[
                 {"role": "system", "content": formatted_prompt},
                 {
@@ -247,27 +361,12 @@ async def generate_circle_summary(story_circle, circles_memory):
                     "content": "Generate a single-paragraph summary of this story circle and return it in the exact JSON format specified in your system prompt. Include only the JSON object, no other text, comments, backticks, or other formatting."
                 }
             ],
-            temperature=0.0,
-            max_tokens=500
+            schema=SUMMARY_SCHEMA,
+            task='summary',
+            temperature=0.0
         )
         
-        # Parse the response with updated response structure
-        try:
-            response_text = response.choices[0].message.content.strip()
-            print("\nAI Raw Response:")
-            print(response_text)  # Debug print
-            
-            summary = json.loads(response_text)
-            
-            return {
-                "memories": summary["memories"] if "memories" in summary else [
-                    "A story about Fwog's adventure (summary generation failed)"
-                ]
-            }
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse AI summary response: {e}\nRaw response: {response_text}")
-            raise
+        return {"memories": summary["memories"]}
             
     except Exception as e:
         logger.error(f"Error generating circle summary: {e}")
@@ -285,13 +384,7 @@ async def archive_completed_circle(story_circle):
         # Generate summary for the completed circle
         try:
             new_memory = await generate_circle_summary(story_circle, circles_memory)
-            
-            # Add the new memories to the existing ones
-            circles_memory["memories"].extend(new_memory["memories"])
-            
-            # Save updated memories
-            await save_circles_memory(circles_memory)
-            logger.info(f"Successfully archived story circle with summary: {new_memory}")
+            await archive_summary(new_memory, circles_memory)
             
         except Exception as e:
             logger.error(f"Error in summary generation: {e}")
@@ -301,6 +394,24 @@ async def archive_completed_circle(story_circle):
         logger.error(f"Error in archive_completed_circle: {e}")
         raise
 
+async def archive_summary(new_memory, circles_memory=None):
+    """Add an already generated circle summary to circles_memory.json"""
+    if circles_memory is None:
+        circles_memory = await load_circles_memory()
+    
+    # Add the new memories to the existing ones
+    circles_memory["memories"].extend(new_memory["memories"])
+    
+    # Fold older circles into epoch summaries so prompts stay bounded
+    try:
+        await compact_circles_memory(circles_memory)
+    except Exception as e:
+        logger.error(f"Error compacting circles memory, keeping it verbatim: {e}")
+    
+    # Save updated memories
+    await save_circles_memory(circles_memory)
+    logger.info(f"Successfully archived story circle with summary: {new_memory}")
+
 async def progress_to_next_event(story_circle):
     """Progress to the next event in the current phase without AI calls"""
     try:
@@ -322,6 +433,7 @@ async def progress_to_next_event(story_circle):
             # Save the updated story circle
             await save_story_circle(story_circle)
             logger.info("Progressed to next event in current phase")
+            schedule_lookahead(story_circle)
             return story_circle
             
         else:
@@ -333,6 +445,109 @@ async def progress_to_next_event(story_circle):
         logger.error(f"Error progressing to next event: {e}")
         raise
 
+def validate_story_circle(story_circle):
+    """Raise ValueError unless the events line up the way the narrative loop relies on"""
+    narrative = story_circle["narrative"]
+    events = narrative["events"]
+    if not events or len(events) != len(narrative["inner_dialogues"]):
+        raise ValueError("$.narrative.events and inner_dialogues must be non-empty and the same length")
+    if narrative["dynamic_context"]["current_event"] not in events:
+        raise ValueError("$.narrative.dynamic_context.current_event is not one of the events")
+
+def needs_archive(new_story_circle, story_circle):
+    """Only archive when moving TO the "Change" phase"""
+    current_phase = new_story_circle["narrative"]["current_phase"]
+    previous_phase = story_circle["narrative"]["current_phase"]
+    return current_phase == "Change" and previous_phase != "Change"
+
+async def generate_next_phase(story_circle):
+    """Ask the model for the next phase and events of the story circle (no saving)"""
+    circles_memory = circles_memory_for_prompt(await load_circles_memory())
+    
+    # Generate creative instructions before updating the story circle
+    creative_storm_instructions = await generate_creative_instructions(circles_memory)
+    
+    # Format the system prompt with current data
+    formatted_prompt = STORY_CIRCLE_PROMPT.format(
+        story_circle=json.dumps(story_circle, indent=2, ensure_ascii=False),
+        circle_memories=compact_json(circles_memory)
+    )
+    
+    # Get the updated narrative from the AI, retrying with a repair hint if the JSON is unusable
+    return await complete_json(
+        messages=[
+            {"role": "system", "content": formatted_prompt},
+            {"role": "user", "content": f"Generate the next story circle update in the exact JSON format as shown in the template in your system prompt, without any additional text or comments, nor backticks, snippets or other formatting. Ensure the new phase or story circle is highly creative and compelling by following these instructions: {creative_storm_instructions}."}
+        ],
+        schema=STORY_CIRCLE_SCHEMA,
+        task='narrative',
+        validator=validate_story_circle,
+        temperature=0.0
+    )
+
+def phase_fingerprint(story_circle):
+    """Identify the phase a lookahead was generated from"""
+    narrative = story_circle["narrative"]
+    key = json.dumps([narrative["current_phase"], narrative["events"]], ensure_ascii=False)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+async def prepare_next_phase(story_circle):
+    """Generate and validate the next phase, plus the circle summary if it will be needed"""
+    new_story_circle = await generate_next_phase(story_circle)
+    summary = None
+    if needs_archive(new_story_circle, story_circle):
+        summary = await generate_circle_summary(story_circle, await load_circles_memory())
+    logger.info(f"Lookahead ready for phase {new_story_circle['narrative']['current_phase']}")
+    return new_story_circle, summary
+
+def schedule_lookahead(story_circle):
+    """Start pre-generating the next phase in the background while events remain"""
+    global _lookahead
+    if not Config.NARRATIVE_LOOKAHEAD:
+        return
+    fingerprint = phase_fingerprint(story_circle)
+    if _lookahead is not None and _lookahead['fingerprint'] == fingerprint:
+        task = _lookahead['task']
+        # Keep a running or successful lookahead; retry a failed one
+        if not task.done() or task.exception() is None:
+            return
+    task = asyncio.create_task(prepare_next_phase(copy.deepcopy(story_circle)))
+    # Failures are reported when the lookahead is taken
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    _lookahead = {'fingerprint': fingerprint, 'task': task}
+    logger.info("Started lookahead generation of the next phase")
+
+async def resume_lookahead():
+    """
+    Start the lookahead on startup or leader change when the next progression
+    would generate a new phase, since only progressing schedules it otherwise
+    """
+    try:
+        story_circle = await load_story_circle()
+        narrative = story_circle["narrative"]
+        current_index = narrative["events"].index(narrative["dynamic_context"]["current_event"])
+        if current_index + 2 >= len(narrative["events"]):
+            schedule_lookahead(story_circle)
+    except Exception as e:
+        logger.error(f"Error resuming narrative lookahead: {e}")
+
+async def take_lookahead(story_circle):
+    """Return the pre-generated (story_circle, summary) for this phase, or None"""
+    global _lookahead
+    if _lookahead is None:
+        return None
+    lookahead, _lookahead = _lookahead, None
+    if lookahead['fingerprint'] != phase_fingerprint(story_circle):
+        lookahead['task'].cancel()
+        logger.info("Discarding lookahead generated for a different phase")
+        return None
+    try:
+        # Usually already done; if still running, finishing it beats starting over
+        return await lookahead['task']
+    except Exception as e:
+        logger.error(f"Lookahead generation failed, generating live: {e}")
+        return None
+
 async def update_story_circle():
     """Update the story circle only when needed (when events are exhausted)"""
     try:
@@ -350,72 +565,75 @@ async def update_story_circle():
             if current_index + 2 < len(current_events):
                 return await progress_to_next_event(story_circle)
         
-        # If we need new events, proceed with AI generation
-        circles_memory = await load_circles_memory()
-        
-        # Generate creative instructions before updating the story circle
-        creative_storm_instructions = await generate_creative_instructions(circles_memory)
+        # If we need new events, swap in the lookahead or generate them now
+        summary = None
+        lookahead = await take_lookahead(story_circle)
+        if lookahead is not None:
+            new_story_circle, summary = lookahead
+            logger.info("Using pre-generated lookahead for the next phase")
+        else:
+            new_story_circle = await generate_next_phase(story_circle)
         
-        # Format the system prompt with current data
-        formatted_prompt = STORY_CIRCLE_PROMPT.format(
-            story_circle=json.dumps(story_circle, indent=2, ensure_ascii=False),
-            circle_memories=json.dumps(circles_memory, indent=2, ensure_ascii=False)
-        )
+        # Check if we've completed a circle
+        current_phase = new_story_circle["narrative"]["current_phase"]
+        if needs_archive(new_story_circle, story_circle):
+            if summary is not None:
+                await archive_summary(summary)
+            else:
+                await archive_completed_circle(story_circle)
         
-        # Get the updated narrative from the AI using new SDK syntax
-        response = await asyncio.to_thread(
-            client.chat.completions.create,
-            model="hf:nvidia/Llama-3.1-Nemotron-70B-Instruct-HF",
-            messages=[
-                {"role": "system", "content": formatted_prompt},
-                {"role": "user", "content": f"Generate the next story circle update in the exact JSON format as shown in the template in your system prompt, without any additional text or comments, nor backticks, snippets or other formatting. Ensure the new phase or story circle is highly creative and compelling by following these instructions: {creative_storm_instructions}."}
-            ],
-            temperature=0.0,
-            max_tokens=1000
-        )
+        # Save the updated story circle
+        await save_story_circle(new_story_circle)
         
-        # Parse the response with updated response structure
-        try:
-            new_story_circle = json.loads(response.choices[0].message.content)
-            
-            # Check if we've completed a circle
-            current_phase = new_story_circle["narrative"]["current_phase"]
-            previous_phase = story_circle["narrative"]["current_phase"]
-            
-            # Only archive when moving TO "Change" phase
-            if current_phase == "Change" and previous_phase != "Change":
-                await archive_completed_circle(story_circle)
-            
-            # Save the updated story circle
-            await save_story_circle(new_story_circle)
-            
-            logger.info(f"Story circle updated successfully. Current phase: {current_phase}")
-            return new_story_circle
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse AI response: {e}")
-            raise
+        logger.info(f"Story circle updated successfully. Current phase: {current_phase}")
+        return new_story_circle
             
     except Exception as e:
         logger.error(f"Error updating story circle: {e}")
         raise
 
-def get_current_context():
-    """Get the current event and inner dialogue for the bot"""
+def build_context(story_circle):
+    """Build an immutable context snapshot from a story circle"""
+    dynamic_context = story_circle['narrative']['dynamic_context']
+    return MappingProxyType({
+        'current_event': dynamic_context['current_event'],
+        'current_inner_dialogue': dynamic_context['current_inner_dialogue']
+    })
+
+def publish_context(story_circle):
+    """Replace the served context snapshot with one built from story_circle"""
+    global _current_context
+    try:
+        # Rebinding the reference is atomic, so readers see either the old or the new snapshot
+        _current_context = build_context(story_circle)
+    except Exception as e:
+        logger.error(f"Error publishing current context: {e}")
+
+def load_current_context():
+    """Read the story circle from disk and publish its context (startup only)"""
+    global _current_context
     try:
         with open(STORY_CIRCLE_PATH, 'r') as f:
             story_circle = json.load(f)
-            
-        return {
-            'current_event': story_circle['narrative']['dynamic_context']['current_event'],
-            'current_inner_dialogue': story_circle['narrative']['dynamic_context']['current_inner_dialogue']
-        }
+        _current_context = build_context(story_circle)
     except Exception as e:
-        logger.error(f"Error getting current context: {e}")
-        return {
-            'current_event': '',
-            'current_inner_dialogue': ''
-        } 
+        logger.error(f"Error loading current context: {e}")
+        _current_context = EMPTY_CONTEXT
+    return _current_context
+
+def adopt_context(context):
+    """Serve a context published by another process"""
+    global _current_context
+    _current_context = MappingProxyType({
+        'current_event': context.get('current_event', ''),
+        'current_inner_dialogue': context.get('current_inner_dialogue', '')
+    })
+
+def get_current_context():
+    """Get the current event and inner dialogue for the bot"""
+    if _current_context is None:
+        return load_current_context()
+    return _current_context
 
 async def progress_narrative():
     """Main function to progress the narrative every 6 hours"""
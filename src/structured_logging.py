@@ -0,0 +1,123 @@
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from config import Config
+
+# Attributes every LogRecord has; anything else was passed as a structured field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_sample_rates = None
+
+def parse_sample_rates(spec):
+    """Parse 'event=rate,event=rate' into a dict of floats"""
+    rates = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        event, rate = item.split('=', 1)
+        rates[event.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+def sample_rate(event):
+    global _sample_rates
+    if _sample_rates is None:
+        _sample_rates = parse_sample_rates(Config.LOG_SAMPLE_RATES)
+    return _sample_rates.get(event, 1.0)
+
+def record_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread untouched, so message interpolation and
+    formatting happen off the event loop. Records are dropped if the queue is full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any structured fields"""
+
+    def format(self, record):
+        payload = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        payload.update(record_fields(record))
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    """The usual LEVEL:logger:message line, with structured fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__('%(levelname)s:%(name)s:%(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value!r}" for key, value in fields.items())
+        return line
+
+def log_event(logger, event, level=logging.INFO, **fields):
+    """
+    Log a structured event, subject to its LOG_SAMPLE_RATES rate.
+    Sampling and level checks happen before the record is built; field values
+    are only formatted by the listener thread.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    rate = sample_rate(event)
+    if rate < 1.0 and random.random() >= rate:
+        return
+    fields['event'] = event
+    logger.log(level, event, extra=fields)
+
+def configure_logging(level=None, fmt=None):
+    """Route every logger through a bounded queue drained by a background thread"""
+    global _listener
+    if _listener is not None:
+        return
+    level = (level or Config.LOG_LEVEL).upper()
+    fmt = fmt or Config.LOG_FORMAT
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(LazyQueueHandler(queue.Queue(Config.LOG_QUEUE_SIZE)))
+    root.setLevel(level)
+
+    _listener = QueueListener(root.handlers[0].queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,114 @@
+import json
+import asyncio
+import logging
+from config import Config
+from llm_gateway import chat_completion
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('structured_output')
+
+REPAIR_PROMPT = """Your previous reply could not be used: {error}.
+Return ONLY the corrected JSON object in the exact format requested, with no additional text, comments, backticks, or other formatting."""
+
+class StructuredOutputError(ValueError):
+    """Raised when a response cannot be turned into the expected JSON"""
+
+def extract_json(text):
+    """
+    Parse the first balanced JSON object found in text.
+    Tolerates code fences and chatter before or after the object.
+    """
+    start = text.find('{')
+    while start != -1:
+        depth = 0
+        in_string = False
+        escaped = False
+        for index in range(start, len(text)):
+            char = text[index]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    try:
+                        return json.loads(text[start:index + 1])
+                    except json.JSONDecodeError:
+                        break
+        # Unbalanced or invalid from here, try the next opening brace
+        start = text.find('{', start + 1)
+    raise StructuredOutputError("no JSON object found in the response")
+
+def validate(value, schema, path='$'):
+    """
+    Check value against a small schema language:
+    a type (str, bool, int, ...), a dict of required keys to schemas,
+    or a one-element list meaning a list of items matching that schema.
+    Extra keys are allowed.
+    """
+    if isinstance(schema, dict):
+        if not isinstance(value, dict):
+            raise StructuredOutputError(f"{path} must be an object")
+        for key, child in schema.items():
+            if key not in value:
+                raise StructuredOutputError(f"{path}.{key} is missing")
+            validate(value[key], child, f"{path}.{key}")
+    elif isinstance(schema, list):
+        if not isinstance(value, list):
+            raise StructuredOutputError(f"{path} must be a list")
+        for index, item in enumerate(value):
+            validate(item, schema[0], f"{path}[{index}]")
+    elif schema is bool:
+        if not isinstance(value, bool):
+            raise StructuredOutputError(f"{path} must be a boolean")
+    elif not isinstance(value, schema) or (isinstance(value, bool) and schema is not bool):
+        raise StructuredOutputError(f"{path} must be of type {schema.__name__}")
+
+def parse_structured(text, schema=None, validator=None):
+    """Extract and validate JSON from a model response"""
+    data = extract_json(text)
+    if schema is not None:
+        validate(data, schema)
+    if validator is not None:
+        try:
+            validator(data)
+        except StructuredOutputError:
+            raise
+        except (ValueError, KeyError, TypeError) as e:
+            raise StructuredOutputError(str(e))
+    return data
+
+async def complete_json(messages, schema=None, validator=None, retries=None, backoff=None, **kwargs):
+    """
+    Run a chat completion and return its validated JSON.
+    Only when extraction or validation fails is the call retried, with exponential
+    backoff and the failing reply plus a repair hint appended to the conversation.
+    Raises StructuredOutputError once the retries are used up.
+    """
+    retries = Config.JSON_MAX_RETRIES if retries is None else retries
+    backoff = Config.JSON_RETRY_BACKOFF if backoff is None else backoff
+    messages = list(messages)
+    for attempt in range(retries + 1):
+        response = await chat_completion(messages=messages, **kwargs)
+        content = response.choices[0].message.content or ''
+        logger.debug(f"Raw structured response: {content}")
+        try:
+            return parse_structured(content, schema, validator)
+        except StructuredOutputError as e:
+            logger.error(f"Unusable structured response (attempt {attempt + 1}/{retries + 1}): {e}")
+            if attempt == retries:
+                raise
+            messages = messages + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": REPAIR_PROMPT.format(error=e)}
+            ]
+            await asyncio.sleep(backoff * (2 ** attempt))